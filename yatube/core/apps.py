@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import db  # noqa: F401
+        from . import template_timing
+        # Метрикам запросов нужно общее время рендеринга шаблонов,
+        # статистика по шаблонам — только профилированию
+        if settings.TEMPLATE_PROFILING or settings.METRICS:
+            template_timing.install(profile=settings.TEMPLATE_PROFILING)
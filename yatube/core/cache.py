@@ -0,0 +1,95 @@
+"""Бэкенды кэша со счетчиками попаданий и промахов.
+
+Профиль выбирается в settings.CACHES переменной окружения YATUBE_CACHE;
+каждый профиль — обычный бэкенд Django с примесью StatsMixin, поэтому
+статистику видно одинаково для любого хранилища
+(см. core.views.cache_health).
+"""
+import threading
+from contextlib import contextmanager
+
+from django.core.cache.backends.db import DatabaseCache as _DatabaseCache
+from django.core.cache.backends.filebased import (
+    FileBasedCache as _FileBasedCache)
+from django.core.cache.backends.locmem import LocMemCache as _LocMemCache
+
+_MISSING = object()
+_lock = threading.Lock()
+_local = threading.local()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def record(hits=0, misses=0):
+    with _lock:
+        _stats['hits'] += hits
+        _stats['misses'] += misses
+    _local.hits = getattr(_local, 'hits', 0) + hits
+    _local.misses = getattr(_local, 'misses', 0) + misses
+
+
+def thread_stats():
+    """Попадания и промахи текущего потока (для метрик запросов)"""
+    return getattr(_local, 'hits', 0), getattr(_local, 'misses', 0)
+
+
+def stats():
+    """Попадания и промахи кэша в текущем процессе"""
+    with _lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else None,
+    }
+
+
+@contextmanager
+def _outermost():
+    """Учитывает только внешний вызов: get_many одних бэкендов вызывает
+    get, а get других — get_many"""
+    depth = getattr(_local, 'depth', 0)
+    _local.depth = depth + 1
+    try:
+        yield depth == 0
+    finally:
+        _local.depth = depth
+
+
+class StatsMixin:
+    def get(self, key, default=None, version=None):
+        with _outermost() as outer:
+            value = super().get(key, _MISSING, version)
+        if outer:
+            record(hits=int(value is not _MISSING),
+                   misses=int(value is _MISSING))
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        with _outermost() as outer:
+            found = super().get_many(keys, version)
+        if outer:
+            record(hits=len(found), misses=len(keys) - len(found))
+        return found
+
+
+class LocMemCache(StatsMixin, _LocMemCache):
+    pass
+
+
+class FileBasedCache(StatsMixin, _FileBasedCache):
+    pass
+
+
+class DatabaseCache(StatsMixin, _DatabaseCache):
+    pass
+
+
+try:
+    from django_redis.cache import RedisCache as _RedisCache
+except ImportError:  # django-redis нужен только для профиля redis
+    pass
+else:
+    class RedisCache(StatsMixin, _RedisCache):
+        pass
@@ -0,0 +1,20 @@
+"""Настройка новых соединений с базой.
+
+Для SQLite каждое соединение получает SQLITE_PRAGMAS: журнал WAL, в
+котором чтение не блокируется записью, synchronous=NORMAL, ожидание
+блокировки вместо ошибки «database is locked» и mmap. Журнал WAL
+хранится в самом файле базы, остальные прагмы действуют только на
+соединение, поэтому они задаются при каждом подключении.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,15 @@
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+
+
+def internal_only(view):
+    """Пускает только персонал и запросы с адресов INTERNAL_IPS"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not (request.user.is_staff
+                or request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS):
+            raise PermissionDenied
+        return view(request, *args, **kwargs)
+    return wrapper
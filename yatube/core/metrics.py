@@ -0,0 +1,141 @@
+"""Метрики запросов по представлениям.
+
+MetricsMiddleware (core.middleware) на каждый запрос снимает время
+ответа, число и время запросов к базе, время рендеринга шаблонов и
+попадания/промахи кэша и складывает их сюда по имени представления
+(posts:index, posts:post_detail, ...). Значения копятся в гистограммах
+с фиксированными корзинами за скользящее окно: METRICS_WINDOW секунд
+делятся на METRICS_SLICES отрезков, и самый старый отрезок
+отбрасывается целиком. snapshot() отдает сводку для /health/metrics/.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+from django.conf import settings
+
+# Верхние границы корзин; последняя корзина — все, что больше
+MS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+HISTOGRAMS = {
+    'wall_ms': MS_BUCKETS,
+    'db_ms': MS_BUCKETS,
+    'template_ms': MS_BUCKETS,
+    'db_queries': COUNT_BUCKETS,
+}
+COUNTERS = ('cache_hits', 'cache_misses', 'errors')
+
+PERCENTILES = (50, 95, 99)
+
+_lock = threading.Lock()
+_slices = deque()
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        for index, count in enumerate(other.buckets):
+            self.buckets[index] += count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        """Верхняя граница корзины, в которую попал перцентиль"""
+        if not self.count:
+            return None
+        rank = self.count * percent / 100
+        seen = 0
+        for bound, count in zip(self.bounds, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'avg': round(self.sum / self.count, 3) if self.count else None,
+            'max': round(self.max, 3),
+            **{f'p{percent}': self.percentile(percent)
+               for percent in PERCENTILES},
+            'buckets': dict(zip(
+                [*map(str, self.bounds), '+Inf'], self.buckets)),
+        }
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.histograms = {name: Histogram(bounds)
+                           for name, bounds in HISTOGRAMS.items()}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def add(self, sample):
+        for name, histogram in self.histograms.items():
+            histogram.add(sample[name])
+        for name in COUNTERS:
+            self.counters[name] += sample.get(name, 0)
+
+    def merge(self, other):
+        for name, histogram in self.histograms.items():
+            histogram.merge(other.histograms[name])
+        for name in COUNTERS:
+            self.counters[name] += other.counters[name]
+
+
+def _slice_length():
+    return settings.METRICS_WINDOW / settings.METRICS_SLICES
+
+
+def _current_slice(now):
+    """Отрезок окна для момента now; устаревшие отрезки выбрасываются"""
+    start = now - now % _slice_length()
+    while _slices and _slices[0][0] <= now - settings.METRICS_WINDOW:
+        _slices.popleft()
+    if not _slices or _slices[-1][0] != start:
+        _slices.append((start, {}))
+    return _slices[-1][1]
+
+
+def record(view_name, sample):
+    """Добавляет замеры одного запроса"""
+    with _lock:
+        views = _current_slice(time.time())
+        views.setdefault(view_name, ViewMetrics()).add(sample)
+
+
+def snapshot():
+    """Сводка по представлениям за скользящее окно"""
+    with _lock:
+        _current_slice(time.time())
+        merged = {}
+        for _, views in _slices:
+            for name, metrics in views.items():
+                merged.setdefault(name, ViewMetrics()).merge(metrics)
+    return {
+        name: {
+            **{metric: histogram.summary()
+               for metric, histogram in metrics.histograms.items()},
+            **metrics.counters,
+        }
+        for name, metrics in sorted(merged.items())
+    }
+
+
+def reset():
+    with _lock:
+        _slices.clear()
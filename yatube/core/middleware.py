@@ -0,0 +1,73 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import cache as cache_stats
+from . import metrics, template_timing
+
+logger = logging.getLogger('core.metrics')
+
+
+class QueryTimer:
+    """execute_wrapper, который считает запросы к базе и их время"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """Снимает метрики каждого запроса и складывает их в core.metrics.
+
+    Ставится первым в MIDDLEWARE, чтобы время ответа включало все
+    остальные middleware. С METRICS_LOG каждый запрос еще и пишется
+    строкой в лог core.metrics.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.log = settings.METRICS_LOG
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        hits, misses = cache_stats.thread_stats()
+        rendered = template_timing.thread_total()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        wall = time.perf_counter() - started
+        new_hits, new_misses = cache_stats.thread_stats()
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else '<unresolved>'
+        sample = {
+            'wall_ms': wall * 1000,
+            'db_queries': timer.count,
+            'db_ms': timer.duration * 1000,
+            'template_ms': (template_timing.thread_total() - rendered) * 1000,
+            'cache_hits': new_hits - hits,
+            'cache_misses': new_misses - misses,
+            'errors': int(response.status_code >= 500),
+        }
+        metrics.record(view_name, sample)
+        if self.log:
+            logger.info(
+                'view=%s status=%s wall_ms=%.1f db_queries=%d db_ms=%.1f '
+                'template_ms=%.1f cache_hits=%d cache_misses=%d',
+                view_name, response.status_code, sample['wall_ms'],
+                sample['db_queries'], sample['db_ms'],
+                sample['template_ms'], sample['cache_hits'],
+                sample['cache_misses'])
+        return response
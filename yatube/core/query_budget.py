@@ -0,0 +1,54 @@
+"""Бюджеты запросов к базе для тестов представлений.
+
+QueryBudgetMixin.assertQueryBudget проверяет, что блок выполнил не
+больше запросов, чем разрешено. Если бюджет превышен, в сообщении
+запросы сгруппированы по шаблону — SQL без литералов, — и повторы
+сверху: N+1 виден как один шаблон с большим счетчиком.
+"""
+import re
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'IN \((?:\s*\?\s*,?)+\)')
+_SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Шаблон запроса: литералы заменены на ?, списки IN свернуты"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def report(queries):
+    """Запросы по шаблонам, самые частые сверху"""
+    patterns = Counter(fingerprint(query['sql']) for query in queries)
+    lines = []
+    for pattern, count in patterns.most_common():
+        marker = 'повтор' if count > 1 else ''
+        lines.append(f'{count:>4} × {marker:<6} {pattern}')
+    return '\n'.join(lines)
+
+
+def route_names(*modules):
+    """Имена маршрутов вида app:name из модулей urls"""
+    return sorted(f'{module.app_name}:{pattern.name}'
+                  for module in modules
+                  for pattern in module.urlpatterns if pattern.name)
+
+
+class QueryBudgetMixin:
+    @contextmanager
+    def assertQueryBudget(self, budget, label=''):
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        executed = len(context)
+        if executed > budget:
+            self.fail(f'{label}: {executed} запросов при бюджете {budget}\n'
+                      f'{report(context.captured_queries)}')
@@ -0,0 +1,42 @@
+"""Компиляция всех шаблонов при старте процесса.
+
+С кэширующим загрузчиком (TEMPLATE_CACHE) шаблон компилируется при
+первом обращении; preload() делает это заранее для шаблонов проекта и
+приложений, чтобы первые запросы каждого воркера не платили за разбор.
+Вызывается из yatube/wsgi.py, то есть только в процессах с запросами.
+"""
+import logging
+import os
+
+from django.conf import settings
+from django.template import TemplateSyntaxError, engines
+from django.template.utils import get_app_template_dirs
+
+logger = logging.getLogger(__name__)
+
+
+def template_names():
+    """Имена всех шаблонов проекта и приложений"""
+    dirs = settings.TEMPLATES[0]['DIRS']
+    for directory in [*dirs, *get_app_template_dirs('templates')]:
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                if filename.endswith(('.html', '.txt')):
+                    path = os.path.join(root, filename)
+                    yield os.path.relpath(path, directory).replace(os.sep,
+                                                                   '/')
+
+
+def preload():
+    """Загружает все шаблоны в кэш загрузчика; возвращает их число"""
+    engine = engines['django']
+    loaded = 0
+    for name in template_names():
+        try:
+            engine.get_template(name)
+        except TemplateSyntaxError:
+            # Например, шаблон стороннего приложения без его библиотек тегов
+            logger.debug('Шаблон %s не скомпилирован', name, exc_info=True)
+        else:
+            loaded += 1
+    return loaded
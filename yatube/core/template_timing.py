@@ -0,0 +1,108 @@
+"""Замер времени рендеринга шаблонов.
+
+install() оборачивает Template._render, поэтому учитываются и страницы,
+и их родители ({% extends %}), и каждый {% include %} внутри циклов.
+Для каждого шаблона копятся число рендеров, полное время и собственное
+время без вложенных шаблонов; stats() отдает их для
+/health/templates/, а thread_total() — общее время внешних рендеров
+в потоке для метрик запросов (core.metrics). Если нужны только метрики,
+install(profile=False) считает одно общее время, не трогая статистику
+по шаблонам и ее блокировку.
+"""
+import threading
+import time
+from functools import wraps
+
+from django.template.base import Template
+
+_lock = threading.Lock()
+_local = threading.local()
+_timings = {}
+
+
+def _record(name, total, own):
+    with _lock:
+        calls, total_sum, own_sum = _timings.get(name, (0, 0.0, 0.0))
+        _timings[name] = (calls + 1, total_sum + total, own_sum + own)
+
+
+def _profiled(original):
+    """Обертка с учетом времени каждого шаблона"""
+    @wraps(original)
+    def _render(self, context):
+        stack = _local.__dict__.setdefault('stack', [])
+        stack.append(0.0)  # сюда вложенные шаблоны добавляют свое время
+        started = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            total = time.perf_counter() - started
+            nested = stack.pop()
+            if stack:
+                stack[-1] += total
+            else:
+                _local.total = getattr(_local, 'total', 0.0) + total
+            _record(self.name or '<string>', total, total - nested)
+
+    _render.timed = 'profile'
+    return _render
+
+
+def _totaled(original):
+    """Обертка только с общим временем внешних рендеров потока: без
+    статистики по шаблонам и общей блокировки"""
+    @wraps(original)
+    def _render(self, context):
+        depth = getattr(_local, 'depth', 0)
+        _local.depth = depth + 1
+        started = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            _local.depth = depth
+            if not depth:
+                _local.total = (getattr(_local, 'total', 0.0)
+                                + time.perf_counter() - started)
+
+    _render.timed = 'total'
+    return _render
+
+
+def install(profile=True):
+    """Включает замер; без profile копится только thread_total() для
+    метрик запросов. Повторный вызов ничего не меняет, а с profile
+    включает полный замер поверх общего времени"""
+    original = Template._render
+    mode = getattr(original, 'timed', None)
+    if mode == 'profile' or (mode and not profile):
+        return
+    if mode:
+        original = original.__wrapped__
+    Template._render = (_profiled if profile else _totaled)(original)
+
+
+def thread_total():
+    """Сколько секунд текущий поток рендерил шаблоны с начала работы"""
+    return getattr(_local, 'total', 0.0)
+
+
+def stats():
+    """Время рендеринга по шаблонам, самые медленные сверху"""
+    with _lock:
+        timings = dict(_timings)
+    rows = [
+        {
+            'template': name,
+            'calls': calls,
+            'total_ms': round(total * 1000, 3),
+            'own_ms': round(own * 1000, 3),
+            'avg_ms': round(total * 1000 / calls, 3),
+        }
+        for name, (calls, total, own) in timings.items()
+    ]
+    return sorted(rows, key=lambda row: row['own_ms'], reverse=True)
+
+
+def reset():
+    with _lock:
+        _timings.clear()
@@ -0,0 +1,192 @@
+import os
+import tempfile
+from http import HTTPStatus
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.template.base import Template
+from django.template.loader import render_to_string
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from . import cache as cache_stats
+from . import metrics, template_preload, template_timing
+
+
+class CacheHealthTest(TestCase):
+    def test_cache_health_reports_backend_and_stats(self):
+        """Страница здоровья кэша отвечает профилем и статистикой"""
+        cache.get('missing-key')
+        response = self.client.get(reverse('core:cache_health'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        data = response.json()
+        self.assertTrue(data['ok'])
+        self.assertEqual(data['profile'], settings.CACHE_PROFILE)
+        self.assertGreaterEqual(data['stats']['misses'], 1)
+
+    def test_cache_health_hidden_from_outside(self):
+        """Со стороннего адреса страница здоровья кэша недоступна"""
+        client = Client(REMOTE_ADDR='10.0.0.1')
+        client.force_login(
+            get_user_model().objects.create_user(username='TestUser'))
+        response = client.get(reverse('core:cache_health'))
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+    def test_stats_count_each_lookup_once(self):
+        """get и get_many учитываются по одному разу на ключ"""
+        cache.set('present', 1)
+        before = cache_stats.stats()
+        cache.get('present')
+        cache.get_many(['present', 'absent'])
+        after = cache_stats.stats()
+        self.assertEqual(after['hits'] - before['hits'], 2)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+
+
+class TemplateTimingTest(TestCase):
+    def setUp(self):
+        self.original_render = Template._render
+        template_timing.install()
+        template_timing.reset()
+
+    def tearDown(self):
+        Template._render = self.original_render
+        template_timing.reset()
+
+    def test_includes_are_timed_per_call(self):
+        """Каждый include учитывается отдельно, а собственное время
+            родителя не включает вложенные шаблоны"""
+        render_to_string('posts/includes/comment_list.html',
+                         {'comments': []})
+        render_to_string('core/403.html')
+        timings = {row['template']: row
+                   for row in template_timing.stats()}
+        self.assertEqual(timings['core/403.html']['calls'], 1)
+        self.assertEqual(timings['base.html']['calls'], 1)
+        self.assertEqual(timings['includes/header.html']['calls'], 1)
+        base = timings['base.html']
+        self.assertLess(base['own_ms'], base['total_ms'])
+
+    def test_total_only_mode_skips_per_template_stats(self):
+        """Без профилирования копится только общее время потока"""
+        Template._render = self.original_render
+        template_timing.install(profile=False)
+        before = template_timing.thread_total()
+        render_to_string('core/403.html')
+        self.assertGreater(template_timing.thread_total(), before)
+        self.assertEqual(template_timing.stats(), [])
+        template_timing.install()
+        render_to_string('core/403.html')
+        self.assertIn('core/403.html', [
+            row['template'] for row in template_timing.stats()])
+
+    def test_timings_view(self):
+        """Страница отдает замеры и обнуляет их по ?reset=1"""
+        render_to_string('core/403.html')
+        response = self.client.get(reverse('core:template_timings'),
+                                   {'reset': 1})
+        names = [row['template'] for row in response.json()['templates']]
+        self.assertIn('core/403.html', names)
+        self.assertEqual(template_timing.stats(), [])
+
+
+class TemplatePreloadTest(TestCase):
+    def test_preload_compiles_project_templates(self):
+        """Предзагрузка компилирует шаблоны проекта и приложений"""
+        names = set(template_preload.template_names())
+        self.assertIn('posts/index.html', names)
+        self.assertIn('core/403.html', names)
+        self.assertGreater(template_preload.preload(), 0)
+
+
+class HistogramTest(SimpleTestCase):
+    def test_percentiles_by_buckets(self):
+        """Перцентиль — верхняя граница его корзины"""
+        histogram = metrics.Histogram(metrics.MS_BUCKETS)
+        for value in [3] * 90 + [40] * 9 + [20000]:
+            histogram.add(value)
+        self.assertEqual(histogram.percentile(50), 5)
+        self.assertEqual(histogram.percentile(95), 50)
+        self.assertEqual(histogram.percentile(100), 20000)
+        self.assertEqual(histogram.summary()['buckets']['+Inf'], 1)
+
+    @override_settings(METRICS_WINDOW=60, METRICS_SLICES=3)
+    def test_old_slices_leave_window(self):
+        """Замеры старше окна отбрасываются"""
+        metrics.reset()
+        sample = dict.fromkeys(metrics.HISTOGRAMS, 1)
+        with mock.patch('core.metrics.time.time', return_value=1000.0):
+            metrics.record('posts:index', sample)
+        with mock.patch('core.metrics.time.time', return_value=1030.0):
+            metrics.record('posts:index', sample)
+            self.assertEqual(
+                metrics.snapshot()['posts:index']['wall_ms']['count'], 2)
+        with mock.patch('core.metrics.time.time', return_value=1070.0):
+            self.assertEqual(
+                metrics.snapshot()['posts:index']['wall_ms']['count'], 1)
+        metrics.reset()
+
+
+class RequestMetricsTest(TestCase):
+    def setUp(self):
+        # Тестовое окружение подменяет Template._render своим
+        self.original_render = Template._render
+        template_timing.install(profile=False)
+        cache.clear()
+        metrics.reset()
+
+    def tearDown(self):
+        Template._render = self.original_render
+
+    def test_request_is_measured_by_view(self):
+        """Запрос попадает в метрики своего представления"""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('core:request_metrics'),
+                                   {'reset': 1})
+        index = response.json()['views']['posts:index']
+        self.assertEqual(index['wall_ms']['count'], 2)
+        self.assertGreater(index['db_queries']['max'], 0)
+        self.assertGreater(index['template_ms']['max'], 0)
+        self.assertGreater(index['cache_hits'] + index['cache_misses'], 0)
+        self.assertNotIn('posts:index', metrics.snapshot())
+
+    def test_metrics_hidden_from_outside(self):
+        """Со стороннего адреса метрики недоступны"""
+        client = Client(REMOTE_ADDR='10.0.0.1')
+        response = client.get(reverse('core:request_metrics'))
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+
+class SqlitePragmasTest(SimpleTestCase):
+    databases = {'default'}
+
+    def pragma(self, conn, name):
+        with conn.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connection_tuned(self):
+        """Прагмы SQLITE_PRAGMAS заданы у соединения"""
+        connection.ensure_connection()
+        self.assertEqual(self.pragma(connection, 'synchronous'), 1)
+        self.assertEqual(self.pragma(connection, 'busy_timeout'),
+                         settings.SQLITE_PRAGMAS['busy_timeout'])
+
+    def test_file_database_uses_wal(self):
+        """Файловая база переходит в режим WAL"""
+        with tempfile.TemporaryDirectory() as directory:
+            conn = DatabaseWrapper({
+                **connection.settings_dict,
+                'NAME': os.path.join(directory, 'db.sqlite3'),
+            })
+            try:
+                self.assertEqual(self.pragma(conn, 'journal_mode'), 'wal')
+                self.assertEqual(self.pragma(conn, 'mmap_size'),
+                                 settings.SQLITE_PRAGMAS['mmap_size'])
+            finally:
+                conn.close()
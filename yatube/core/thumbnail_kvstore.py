@@ -0,0 +1,32 @@
+"""Хранилище ключей sorl-thumbnail с пакетным чтением.
+
+Записи, как и в стандартном cached_db-хранилище, лежат в таблице
+thumbnail_kvstore и дублируются в общем кэше (settings.CACHES), а
+get_many читает записи сразу для нескольких картинок: одним get_many
+к кэшу и не больше чем одним запросом к базе для промахов.
+"""
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.images import deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as _KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+
+class KVStore(_KVStore):
+    def get_many(self, image_files):
+        """Возвращает словарь key -> ImageFile для найденных картинок"""
+        keys = {add_prefix(image_file.key): image_file.key
+                for image_file in image_files}
+        values = self.cache.get_many(list(keys))
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = dict(KVStoreModel.objects.filter(key__in=missing)
+                         .values_list('key', 'value'))
+            # Отсутствие записи тоже кэшируется, как в _get_raw
+            self.cache.set_many(
+                {key: found.get(key, EMPTY_VALUE) for key in missing},
+                settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(found)
+        return {keys[key]: deserialize_image_file(value)
+                for key, value in values.items() if value != EMPTY_VALUE}
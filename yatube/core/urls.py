@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+app_name = 'core'
+
+urlpatterns = [
+    path('cache/', views.cache_health, name='cache_health'),
+    path('templates/', views.template_timings, name='template_timings'),
+    path('metrics/', views.request_metrics, name='request_metrics'),
+]
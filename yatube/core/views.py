@@ -1,4 +1,14 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.views.decorators.cache import never_cache
+
+from . import cache as cache_stats
+from . import metrics, template_timing
+from .decorators import internal_only
 
 
 def page_not_found(request, exception):
@@ -15,3 +25,58 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+@never_cache
+@internal_only
+def cache_health(request):
+    """Проверяет кэш записью и чтением ключа и отдает статистику"""
+    stats = cache_stats.stats()
+    key = 'health:probe'
+    started = time.perf_counter()
+    try:
+        cache.set(key, started, 10)
+        ok = cache.get(key) == started
+        cache.delete(key)
+        error = None
+    except Exception as exc:  # недоступное хранилище — тоже ответ
+        ok, error = False, str(exc)
+    options = settings.CACHES['default']
+    return JsonResponse({
+        'ok': ok,
+        'error': error,
+        'profile': settings.CACHE_PROFILE,
+        'backend': options['BACKEND'],
+        'key_prefix': options.get('KEY_PREFIX', ''),
+        'version': options.get('VERSION', 1),
+        'roundtrip_ms': round((time.perf_counter() - started) * 1000, 3),
+        'stats': stats,
+    }, status=200 if ok else 503)
+
+
+@never_cache
+@internal_only
+def template_timings(request):
+    """Время рендеринга шаблонов; ?reset=1 обнуляет счетчики"""
+    timings = template_timing.stats()
+    if request.GET.get('reset'):
+        template_timing.reset()
+    return JsonResponse({
+        'profiling': settings.TEMPLATE_PROFILING,
+        'cached_loader': settings.TEMPLATE_CACHE,
+        'templates': timings,
+    })
+
+
+@never_cache
+@internal_only
+def request_metrics(request):
+    """Метрики запросов по представлениям; ?reset=1 обнуляет их"""
+    views = metrics.snapshot()
+    if request.GET.get('reset'):
+        metrics.reset()
+    return JsonResponse({
+        'enabled': settings.METRICS,
+        'window_seconds': settings.METRICS_WINDOW,
+        'views': views,
+    })
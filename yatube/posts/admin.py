@@ -1,16 +1,105 @@
-from django.contrib import admin
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
 
+from . import moderation, search
 from .models import Post
 from .models import Group
 from .models import Comment
+from .page_counts import EstimatedCount
 
 
-class PostAdmin(admin.ModelAdmin):
+class EstimatedCountPaginator(Paginator):
+    """Paginator, который не считает записи COUNT(*) на каждый просмотр"""
+
+    @cached_property
+    def count(self):
+        value, _ = EstimatedCount().count(self.object_list)
+        return value
+
+
+class PerformanceAdmin(admin.ModelAdmin):
+    """Список, который открывается быстро и на миллионах строк.
+
+    Связанные объекты подтягиваются одним JOIN, число записей берется
+    приблизительное, общее число без фильтров не считается, а поиск идет
+    по индексу FTS5 (posts.search), если он есть.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not search.available():
+            return super().get_search_results(request, queryset,
+                                              search_term)
+        return search.filter_queryset(queryset, search_term), False
+
+
+class PostActionForm(ActionForm):
+    group = forms.ModelChoiceField(Group.objects.all(), required=False,
+                                   label='Группа')
+
+
+class CommentActionForm(ActionForm):
+    since = forms.DateField(required=False, label='С',
+                            widget=forms.DateInput(attrs={'type': 'date'}))
+    until = forms.DateField(required=False, label='По',
+                            widget=forms.DateInput(attrs={'type': 'date'}))
+
+
+def _action_data(modeladmin, request):
+    form = modeladmin.action_form(request.POST)
+    form.fields['action'].choices = modeladmin.get_action_choices(request)
+    return form.cleaned_data if form.is_valid() else None
+
+
+def _report(modeladmin, request, message, done):
+    modeladmin.message_user(
+        request,
+        f'{message}: {done} (пачками по {settings.MODERATION_BATCH_SIZE})',
+        messages.SUCCESS)
+
+
+class PostAdmin(PerformanceAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group', 'image')
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date', 'group')
     empty_value_display = '-пусто-'
     list_editable = ('group',)
+    raw_id_fields = ('author',)
+    action_form = PostActionForm
+    actions = ('move_to_group', 'delete_author_posts')
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        """Выбор группы в строках списка загружает группы один раз
+        на запрос, а не в каждой строке"""
+        field = super().formfield_for_foreignkey(db_field, request,
+                                                 **kwargs)
+        if db_field.name == 'group':
+            if not hasattr(request, '_group_choices'):
+                request._group_choices = list(field.choices)
+            field.choices = request._group_choices
+        return field
+
+    def move_to_group(self, request, queryset):
+        data = _action_data(self, request)
+        if data is None:
+            self.message_user(request, 'Неверная группа', messages.ERROR)
+            return
+        done = moderation.regroup_posts(queryset, data['group'])
+        _report(self, request, 'Перенесено постов', done)
+    move_to_group.short_description = 'Перенести в группу'
+
+    def delete_author_posts(self, request, queryset):
+        authors = set(queryset.values_list('author_id', flat=True))
+        done = moderation.delete_posts_by_authors(authors)
+        _report(self, request, 'Удалено постов', done)
+    delete_author_posts.short_description = (
+        'Удалить все посты авторов выбранных постов')
 
 
 class GroupAdmin(admin.ModelAdmin):
@@ -20,11 +109,29 @@ class GroupAdmin(admin.ModelAdmin):
     list_editable = ('description',)
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(PerformanceAdmin):
     list_display = ('pk', 'post', 'author', 'text', 'created')
+    list_select_related = ('post', 'author')
     search_fields = ('text', 'post__text', 'author__username')
-    list_filter = ('created', 'author')
+    # Фильтр по автору выводил бы всех пользователей сайта
+    list_filter = ('created',)
     empty_value_display = '-пусто-'
+    raw_id_fields = ('post', 'author')
+    # Новые сверху: порядок по первичному ключу не требует сортировки
+    ordering = ('-pk',)
+    action_form = CommentActionForm
+    actions = ('purge_comments',)
+
+    def purge_comments(self, request, queryset):
+        data = _action_data(self, request)
+        if data is None:
+            self.message_user(request, 'Неверные даты', messages.ERROR)
+            return
+        done = moderation.purge_comments(queryset, data['since'],
+                                         data['until'])
+        _report(self, request, 'Удалено комментариев', done)
+    purge_comments.short_description = (
+        'Удалить выбранные комментарии за период')
 
 
 admin.site.register(Post, PostAdmin)
@@ -0,0 +1,245 @@
+"""Нагрузочный прогон представлений posts.
+
+seed() заполняет пустую базу воспроизводимым набором данных: значения
+полей генерирует mixer (Faker) с фиксированным seed, строки пишутся
+bulk_create, а счетчики, ленты подписок и поисковый индекс строятся
+после вставки. run() прогоняет каждый маршрут posts.urls через
+тестовый клиент и для каждого сценария считает p50/p95/p99 времени
+ответа, число запросов к базе и пропускную способность. Результат —
+словарь, который команда benchmark пишет в JSON и сравнивает
+с прошлым прогоном.
+"""
+import random
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from mixer.backend.django import Mixer
+
+from core.middleware import QueryTimer
+
+from . import counters, search, timeline
+from .models import Comment, Follow, Group, Post, User
+from .urls import app_name, urlpatterns
+
+SIZES = {
+    'users': 100,
+    'groups': 10,
+    'posts': 2000,
+    'comments': 5000,
+    'follows': 1000,
+}
+
+PERCENTILES = (50, 95, 99)
+
+# Ленты для сравнения профилей базы (--only feeds)
+FEED_ROUTES = ['index', 'group_list', 'profile', 'follow_index']
+
+BATCH_SIZE = 500
+
+
+def _bulk_create(model, objects):
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, BATCH_SIZE))
+        if not batch:
+            break
+        model.objects.bulk_create(batch)
+
+
+def seed(sizes, seed_value=0):
+    """Заполняет базу набором данных размера sizes"""
+    rng = random.Random(seed_value)
+    random.seed(seed_value)
+    mixer = Mixer(commit=False)
+    mixer.faker.seed_instance(seed_value)
+    _bulk_create(User, (
+        mixer.blend(User, username=f'user{index}', is_staff=False,
+                    is_superuser=False)
+        for index in range(sizes['users'])))
+    _bulk_create(Group, (
+        mixer.blend(Group, slug=f'group-{index}', posts_count=0)
+        for index in range(sizes['groups'])))
+    user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+    group_ids = [None, *Group.objects.order_by('pk')
+                 .values_list('pk', flat=True)]
+    _bulk_create(Post, (
+        mixer.blend(Post, author_id=rng.choice(user_ids),
+                    group_id=rng.choice(group_ids), image='',
+                    image_renditions='', comments_count=0)
+        for _ in range(sizes['posts'])))
+    post_ids = list(Post.objects.order_by('pk').values_list('pk', flat=True))
+    _bulk_create(Comment, (
+        mixer.blend(Comment, author_id=rng.choice(user_ids),
+                    post_id=rng.choice(post_ids))
+        for _ in range(sizes['comments'])))
+    pairs = {(user, author) for user, author in (
+        rng.sample(user_ids, 2) for _ in range(sizes['follows']))}
+    _bulk_create(Follow, (Follow(user_id=user, author_id=author)
+                          for user, author in sorted(pairs)))
+    for user, author in sorted(pairs):
+        timeline.backfill(user, author)
+    counters.rebuild_all()
+    search.rebuild()
+
+
+class Fixtures:
+    """Объекты из базы, на которых строятся адреса сценариев"""
+
+    def __init__(self):
+        author_id = (Post.objects.order_by('author_id')
+                     .values_list('author_id', flat=True).first())
+        self.author = User.objects.get(pk=author_id)
+        self.post = Post.objects.filter(author=self.author).latest('pk')
+        self.group = (Group.objects.filter(posts__isnull=False)
+                      .order_by('pk').first())
+        self.other = User.objects.exclude(pk=self.author.pk).latest('pk')
+
+    def throwaway_post_url(self):
+        """Адрес удаления нового поста: каждый запрос удаляет свой"""
+        post = Post.objects.create(author=self.author, text='Удалить')
+        return reverse('posts:post_delete', args=[post.pk])
+
+
+def scenarios(fixtures):
+    """Сценарии по именам маршрутов: (метод, адрес, данные, вход под
+    автором, функция, которая дает адрес перед каждым запросом)"""
+    post, group = fixtures.post, fixtures.group
+    author, other = fixtures.author, fixtures.other
+    readers = {
+        'index': reverse('posts:index'),
+        'group_list': reverse('posts:group_list', args=[group.slug]),
+        'profile': reverse('posts:profile', args=[author.username]),
+        'post_detail': reverse('posts:post_detail', args=[post.pk]),
+        'post_comments': reverse('posts:post_comments', args=[post.pk]),
+        'search': reverse('posts:search') + '?q=the',
+    }
+    result = {}
+    for name, url in readers.items():
+        result[name] = ('get', url, None, False, None)
+        result[f'{name} (auth)'] = ('get', url, None, True, None)
+    result.update({
+        'post_create': ('get', reverse('posts:post_create'), None, True,
+                        None),
+        'post_edit': ('get', reverse('posts:post_edit', args=[post.pk]),
+                      None, True, None),
+        'add_comment': ('post', reverse('posts:add_comment', args=[post.pk]),
+                        {'text': 'Комментарий'}, True, None),
+        'follow_index': ('get', reverse('posts:follow_index'), None, True,
+                         None),
+        'profile_follow': ('get', reverse('posts:profile_follow',
+                                          args=[other.username]),
+                           None, True, None),
+        'profile_unfollow': ('get', reverse('posts:profile_unfollow',
+                                            args=[other.username]),
+                             None, True, None),
+        'post_delete': ('get', None, None, True,
+                        fixtures.throwaway_post_url),
+    })
+    return result
+
+
+def missing_routes(names):
+    """Маршруты posts.urls, для которых нет сценария"""
+    covered = {name.split(' ')[0] for name in names}
+    return sorted(f'{app_name}:{pattern.name}' for pattern in urlpatterns
+                  if pattern.name not in covered)
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу"""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[rank - 1]
+
+
+def measure(client, method, url, data, iterations, prepare=None,
+            cold=False):
+    """Прогоняет один сценарий и возвращает сводку замеров.
+
+    prepare, если задан, перед каждым запросом возвращает его адрес;
+    cold очищает кэш перед каждым запросом. Подготовка в замер не входит.
+    """
+    timings, queries, statuses = [], [], {}
+    started = time.perf_counter()
+    for _ in range(iterations):
+        target = prepare() if prepare is not None else url
+        if cold:
+            cache.clear()
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            request_started = time.perf_counter()
+            response = getattr(client, method)(target, data)
+            timings.append((time.perf_counter() - request_started) * 1000)
+        queries.append(timer.count)
+        status = str(response.status_code)
+        statuses[status] = statuses.get(status, 0) + 1
+    busy = sum(timings) / 1000
+    return {
+        'iterations': iterations,
+        **{f'p{percent}_ms': round(percentile(timings, percent), 3)
+           for percent in PERCENTILES},
+        'mean_ms': round(sum(timings) / iterations, 3),
+        'queries': {
+            'min': min(queries),
+            'p50': percentile(queries, 50),
+            'max': max(queries),
+        },
+        'rps': round(iterations / busy, 1) if busy else None,
+        'wall_s': round(time.perf_counter() - started, 3),
+        'statuses': statuses,
+    }
+
+
+def database_info():
+    """Профиль базы и настройки соединения для отчета"""
+    info = {
+        'vendor': connection.vendor,
+        'profile': settings.DATABASE_PROFILE,
+        'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+    }
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for name in settings.SQLITE_PRAGMAS:
+                cursor.execute(f'PRAGMA {name}')
+                info[name] = cursor.fetchone()[0]
+    return info
+
+
+def run(iterations, warmup=1, cold=False, only=None):
+    """Прогоняет сценарии (все или с именами маршрутов из only)"""
+    fixtures = Fixtures()
+    anonymous, author = Client(), Client()
+    author.force_login(fixtures.author)
+    results = {}
+    for name, (method, url, data, login, prepare) in scenarios(
+            fixtures).items():
+        if only and name.split(' ')[0] not in only:
+            continue
+        client = author if login else anonymous
+        if warmup:
+            measure(client, method, url, data, warmup, prepare, cold)
+        results[name] = measure(client, method, url, data, iterations,
+                                prepare, cold)
+    return results
+
+
+def compare(previous, current):
+    """Изменение p50 и числа запросов относительно прошлого прогона"""
+    rows = []
+    for name, result in current.items():
+        before = previous.get(name)
+        if before is None:
+            continue
+        rows.append({
+            'scenario': name,
+            'p50_ms': (before['p50_ms'], result['p50_ms']),
+            'p50_change': (round(result['p50_ms'] / before['p50_ms'] - 1, 3)
+                           if before['p50_ms'] else None),
+            'queries': (before['queries']['p50'], result['queries']['p50']),
+        })
+    return rows
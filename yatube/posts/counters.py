@@ -0,0 +1,89 @@
+"""Денормализованные счетчики постов, комментариев и подписок.
+
+Счетчики сдвигаются сигналами из posts.signals; если они разошлись
+с данными (например, после bulk_create), их пересчитывает команда
+``python manage.py rebuild_counters``.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorCounters, Comment, Follow, Group, Post, User
+
+
+def _count_subquery(queryset, field):
+    """Подзапрос с количеством записей queryset на каждый OuterRef"""
+    counted = (queryset.filter(**{field: OuterRef('pk')})
+               .order_by()
+               .values(field)
+               .annotate(total=Count('pk'))
+               .values('total'))
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def _shift(queryset, field, delta):
+    """Сдвигает счетчик без ухода в отрицательные значения.
+    Возвращает количество обновленных строк."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def shift_author(user_id, field, delta):
+    """Сдвигает счетчик пользователя.
+
+    Если у пользователя еще нет строки счетчиков, при увеличении она
+    создается пересчетом; уменьшать отсутствующую строку незачем.
+    """
+    if (not _shift(AuthorCounters.objects.filter(user_id=user_id),
+                   field, delta)
+            and delta > 0):
+        rebuild_authors(User.objects.filter(pk=user_id))
+
+
+def shift_group(group_id, delta):
+    if group_id is not None:
+        _shift(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def shift_post(post_id, delta):
+    _shift(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def get_author_counters(user):
+    """Счетчики пользователя; недостающая строка создается пересчетом"""
+    try:
+        return user.counters
+    except AuthorCounters.DoesNotExist:
+        rebuild_authors(User.objects.filter(pk=user.pk))
+        return AuthorCounters.objects.get(user=user)
+
+
+def rebuild_authors(users):
+    """Пересчитывает счетчики переданных пользователей"""
+    existing = AuthorCounters.objects.filter(user__in=users)
+    AuthorCounters.objects.bulk_create(
+        [AuthorCounters(user_id=pk) for pk in users.exclude(
+            pk__in=existing.values('user')).values_list('pk', flat=True)],
+        ignore_conflicts=True,
+    )
+    AuthorCounters.objects.filter(user__in=users).update(
+        posts_count=_count_subquery(Post.objects.all(), 'author'),
+        followers_count=_count_subquery(Follow.objects.all(), 'author'),
+        following_count=_count_subquery(Follow.objects.all(), 'user'),
+    )
+
+
+def rebuild_groups(groups):
+    groups.update(posts_count=_count_subquery(Post.objects.all(), 'group'))
+
+
+def rebuild_posts(posts):
+    posts.update(
+        comments_count=_count_subquery(Comment.objects.all(), 'post'))
+
+
+def rebuild_all():
+    """Пересчитывает все счетчики с нуля"""
+    rebuild_authors(User.objects.all())
+    rebuild_groups(Group.objects.all())
+    rebuild_posts(Post.objects.all())
@@ -0,0 +1,123 @@
+"""Кэш лент с поколениями.
+
+У каждой ленты — всей (index), группы и автора — есть счетчик
+поколения. Он входит в ключ закэшированных фрагментов, а сигналы
+увеличивают его при создании, изменении и удалении поста: старые
+фрагменты сразу становятся недостижимыми и просто вытесняются из кэша,
+а не ждут истечения короткого TTL.
+
+Имена авторов и названия групп выводят почти все страницы, поэтому
+у них одно общее поколение names_scope: оно входит в ключ каждой
+страницы и сдвигается при переименовании автора, изменении или
+удалении группы.
+
+Из тех же поколений CachedPage строит ETag целой страницы: повторный
+запрос с If-None-Match получает 304 без рендеринга, а ответы анонимам
+целиком хранятся в общем кэше.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+
+def index_scope():
+    return 'index'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def names_scope():
+    return 'names'
+
+
+def _generation_key(scope):
+    return f'feed-generation:{scope}'
+
+
+def _initial_generation():
+    # Если счетчик вытеснили из кэша, новый отсчет начинается с текущего
+    # времени, чтобы не совпасть со старыми поколениями
+    return time.time_ns() // 1000
+
+
+def generations(*scopes):
+    """Текущие поколения лент в порядке scopes"""
+    keys = [_generation_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _initial_generation(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump(*scopes):
+    """Сдвигает поколения лент, делая их кэш устаревшим"""
+    for scope in scopes:
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_generation(), None)
+
+
+def bump_post(post, *group_ids):
+    """Сдвигает поколения всех лент, в которых виден пост"""
+    group_ids = {post.group_id, *group_ids} - {None}
+    bump(index_scope(), author_scope(post.author_id), post_scope(post.pk),
+         *(group_scope(group_id) for group_id in group_ids))
+
+
+def feed_cache_context(request, *scopes):
+    """Переменные для {% cache %} ленты: таймаут и ключ из поколений
+    лент и номера или курсора страницы"""
+    page = [request.GET.get(name, '') for name in ('page', 'after', 'before')]
+    key = [*generations(*scopes, names_scope()), *page]
+    return {
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+        'feed_cache_key': ':'.join(map(str, key)),
+    }
+
+
+class CachedPage:
+    """ETag страницы из поколений ее лент и кэш целых ответов анонимам.
+
+    Если response не None, представление сразу возвращает его: это 304
+    или готовый ответ из кэша. Иначе ответ проходит через finish().
+    """
+
+    def __init__(self, request, *scopes):
+        self.request = request
+        user_id = (request.user.pk if request.user.is_authenticated
+                   else None)
+        state = repr((generations(*scopes, names_scope()), user_id,
+                      request.get_full_path()))
+        digest = hashlib.md5(state.encode()).hexdigest()
+        self.etag = f'"{digest}"'
+        self.key = f'page:{digest}' if user_id is None else None
+        self.response = get_conditional_response(request, etag=self.etag)
+        if self.response is None and self.key:
+            self.response = cache.get(self.key)
+
+    def finish(self, response):
+        if response.status_code != 200:
+            return response
+        response['ETag'] = self.etag
+        patch_vary_headers(response, ('Cookie',))
+        # Страницу с CSRF-токеном нельзя отдавать другим посетителям
+        if self.key and not self.request.META.get('CSRF_COOKIE_USED'):
+            cache.set(self.key, response, settings.FEED_CACHE_TIMEOUT)
+        return response
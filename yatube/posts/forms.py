@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from .models import Post, Comment
+from . import images
 
 
 class PostForm(forms.ModelForm):
@@ -7,6 +9,14 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('group', 'text', 'image')
 
+    def clean_image(self):
+        """Проверяет загруженную картинку и уменьшает слишком большую"""
+        image = self.cleaned_data['image']
+        if not isinstance(image, UploadedFile):
+            return image
+        images.validate(image)
+        return images.downscale(image)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,83 @@
+"""Обработка загружаемых картинок постов.
+
+Крупные загрузки Django пишет во временный файл частями
+(FILE_UPLOAD_MAX_MEMORY_SIZE), а здесь размер и число пикселей
+проверяются по заголовку картинки, без декодирования. Оригиналы больше
+POST_IMAGE_MAX_SIDE уменьшаются один раз при загрузке, чтобы при
+построении вариантов (posts.thumbnails) не декодировать их целиком.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps
+from sorl.thumbnail.base import EXTENSIONS
+
+# Форматы, которые можно пересохранить без потери прозрачности и т. п.
+RESAVE_FORMATS = {'JPEG', 'PNG', 'WEBP'}
+
+MIME_TYPES = {'WEBP': 'image/webp', 'AVIF': 'image/avif'}
+
+
+def extra_formats():
+    """Дополнительные форматы вариантов, которые умеют Pillow и sorl"""
+    Image.init()
+    return [fmt for fmt in settings.POST_IMAGE_EXTRA_FORMATS
+            if fmt in Image.SAVE and fmt in EXTENSIONS]
+
+
+def _open(upload):
+    if hasattr(upload, 'temporary_file_path'):
+        return Image.open(upload.temporary_file_path())
+    upload.seek(0)
+    return Image.open(upload)
+
+
+def validate(upload):
+    """Проверяет размер файла и картинки, читая только заголовок"""
+    if upload.size > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            'Файл больше %(limit)d МБ',
+            code='file_too_large',
+            params={'limit': settings.POST_IMAGE_MAX_UPLOAD_SIZE // 2**20},
+        )
+    width, height = upload.image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка слишком большая: %(width)d×%(height)d',
+            code='image_too_large',
+            params={'width': width, 'height': height},
+        )
+
+
+def downscale(upload):
+    """Уменьшает оригинал до POST_IMAGE_MAX_SIDE по большей стороне.
+
+    Картинки, которые уже меньше предела, и анимации возвращаются
+    как есть.
+    """
+    limit = settings.POST_IMAGE_MAX_SIDE
+    if (max(upload.image.size) <= limit
+            or upload.image.format not in RESAVE_FORMATS):
+        return upload
+    image = _open(upload)
+    if getattr(image, 'is_animated', False):
+        return upload
+    # JPEG сразу декодируется в уменьшенном масштабе
+    image.draft('RGB', (limit, limit))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((limit, limit), Image.LANCZOS)
+    output = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    params = {'quality': 85, 'optimize': True}
+    if upload.image.format == 'JPEG':
+        params['progressive'] = True
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+    image.save(output, upload.image.format, **params)
+    size = output.tell()
+    output.seek(0)
+    name = os.path.basename(upload.name)
+    return UploadedFile(output, name, upload.content_type, size)
@@ -0,0 +1,124 @@
+import json
+import platform
+import subprocess
+from datetime import datetime
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (setup_test_environment,
+                               teardown_test_environment)
+
+from posts import benchmark
+from posts.models import Post
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Заполняет тестовую базу данными заданного размера и замеряет '
+            'время ответа и число запросов всех страниц posts')
+
+    def add_arguments(self, parser):
+        for name, default in benchmark.SIZES.items():
+            parser.add_argument(f'--{name}', type=int, default=default,
+                                help=f'Сколько создать (по умолчанию '
+                                     f'{default})')
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Множитель для всех размеров')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кэш перед каждым запросом')
+        parser.add_argument('--only', nargs='+', metavar='ROUTE',
+                            help='Только эти маршруты, например index; '
+                                 'feeds — все ленты')
+        parser.add_argument('--output', help='Файл для JSON с результатами')
+        parser.add_argument('--compare', metavar='JSON',
+                            help='Сравнить с результатами прошлого прогона')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Не удалять тестовую базу после прогона')
+
+    def handle(self, *args, **options):
+        sizes = {name: max(1, round(options[name] * options['scale']))
+                 for name in benchmark.SIZES}
+        only = options['only']
+        if only and 'feeds' in only:
+            only = [name for name in only if name != 'feeds']
+            only += benchmark.FEED_ROUTES
+        previous = None
+        if options['compare']:
+            with open(options['compare']) as file:
+                previous = json.load(file)
+        # Как в тестах: без DEBUG, а значит и без debug_toolbar
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            if not Post.objects.exists():
+                self.stderr.write(f'Заполнение базы: {sizes}')
+                benchmark.seed(sizes, options['seed'])
+            fixtures = benchmark.Fixtures()
+            missing = benchmark.missing_routes(
+                benchmark.scenarios(fixtures))
+            if missing:
+                raise CommandError(
+                    f'Нет сценариев для маршрутов: {", ".join(missing)}')
+            database = benchmark.database_info()
+            results = benchmark.run(options['iterations'], options['warmup'],
+                                    options['cold'], only)
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+        report = {
+            'meta': {
+                'commit': _commit(),
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': database,
+                'sizes': sizes,
+                'seed': options['seed'],
+                'iterations': options['iterations'],
+                'cold_cache': options['cold'],
+            },
+            'results': results,
+        }
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(text)
+            self._table(results)
+        else:
+            self.stdout.write(text)
+        if previous is not None:
+            self._comparison(benchmark.compare(previous['results'], results))
+
+    def _table(self, results):
+        self.stdout.write(f'{"сценарий":<24}{"p50":>9}{"p95":>9}{"p99":>9}'
+                          f'{"запросы":>9}{"rps":>9}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<24}{result["p50_ms"]:>9.2f}{result["p95_ms"]:>9.2f}'
+                f'{result["p99_ms"]:>9.2f}{result["queries"]["p50"]:>9}'
+                f'{result["rps"] or 0:>9.0f}')
+
+    def _comparison(self, rows):
+        for row in rows:
+            change = row['p50_change']
+            style = (self.style.ERROR if change is not None and change > 0.1
+                     else self.style.SUCCESS)
+            self.stdout.write(style(
+                f'{row["scenario"]:<24} p50 {row["p50_ms"][0]} -> '
+                f'{row["p50_ms"][1]} мс'
+                + (f' ({change:+.0%})' if change is not None else '')
+                + f', запросы {row["queries"][0]} -> {row["queries"][1]}'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import build
+
+
+class Command(BaseCommand):
+    help = ('Строит варианты картинок для постов, у которых их нет '
+            'или они остались от прежней картинки')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Перестроить варианты у всех постов')
+
+    def handle(self, *args, **options):
+        posts = (Post.objects.exclude(image='').exclude(image__isnull=True)
+                 .only('image', 'image_renditions').order_by('pk'))
+        built = failed = 0
+        for post in posts.iterator():
+            if post.renditions and not options['all']:
+                continue
+            if build(post.pk):
+                built += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Построено: {built}, с ошибками: {failed}'))
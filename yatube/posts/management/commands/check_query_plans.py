@@ -0,0 +1,82 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Post, TimelineEntry
+from posts.utils import CursorPaginator
+from yatube.settings import POSTS_NUMBER
+
+# Полный проход по таблице (SCAN без индекса) и сортировка во временном
+# B-дереве означают, что запросу не хватает индекса
+FULL_SCAN = re.compile(r'\bSCAN\b(?!.*\bINDEX\b)')
+TEMP_SORT = re.compile(r'\bTEMP B-TREE\b')
+
+
+def cursor_queries(name, queryset, date_field='pub_date', descending=True):
+    """Запросы первой страницы и страниц за курсором в обе стороны"""
+    paginator = CursorPaginator(queryset, POSTS_NUMBER, date_field,
+                                descending)
+    key = (timezone.now(), 1)
+    return [
+        (name, paginator.page_queryset()),
+        (f'{name} ?after=', paginator.page_queryset(key)),
+        (f'{name} ?before=', paginator.page_queryset(key, reverse=True)),
+    ]
+
+
+def view_queries():
+    """Запросы, которые выполняют представления posts/views.py"""
+    user_id = author_id = group_id = post_id = 1
+    return [
+        *cursor_queries('posts:index', Post.objects.for_feed()),
+        *cursor_queries('posts:group_list',
+                        Post.objects.for_feed().filter(group_id=group_id)),
+        *cursor_queries('posts:profile',
+                        Post.objects.for_feed().filter(author_id=author_id)),
+        *cursor_queries('posts:follow_index',
+                        TimelineEntry.objects.for_feed()
+                        .filter(user_id=user_id)),
+        ('posts:profile following',
+         Follow.objects.filter(user_id=user_id, author_id=author_id)),
+        *cursor_queries('posts:post_comments',
+                        Comment.objects.filter(post_id=post_id)
+                        .select_related('author'),
+                        'created', descending=False),
+        ('posts:post_detail',
+         Post.objects.for_detail().filter(pk=post_id)),
+        ('fan-out followers',
+         Follow.objects.filter(author_id=author_id).values('user_id')),
+        ('follow backfill',
+         Post.objects.filter(author_id=author_id)
+         .order_by('-pub_date', '-pk').values('pk', 'pub_date')),
+        ('unfollow trim',
+         TimelineEntry.objects.filter(user_id=user_id, author_id=author_id)),
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для запросов представлений posts и падает, '
+            'если какой-то из них читает таблицу целиком или сортирует '
+            'во временном B-дереве (только для SQLite)')
+
+    def handle(self, *args, **options):
+        check = connection.vendor == 'sqlite'
+        failures = []
+        for name, queryset in view_queries():
+            plan = queryset.explain()
+            problems = [line for line in plan.splitlines()
+                        if FULL_SCAN.search(line) or TEMP_SORT.search(line)]
+            status = 'FAIL' if check and problems else 'ok'
+            self.stdout.write(f'[{status}] {name}')
+            for line in plan.splitlines():
+                self.stdout.write(f'    {line}')
+            if check and problems:
+                failures.append(name)
+        if failures:
+            raise CommandError(
+                'Запросы без подходящего индекса: ' + ', '.join(failures))
+        if not check:
+            self.stdout.write(self.style.WARNING(
+                'Планы не проверялись: проверка есть только для SQLite'))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import synthetic
+
+
+class Command(BaseCommand):
+    help = ('Создает синтетических пользователей, группы, посты, '
+            'комментарии и подписки пачками bulk_create')
+
+    def add_arguments(self, parser):
+        for name, default in synthetic.SIZES.items():
+            parser.add_argument(f'--{name}', type=int, default=default,
+                                help=f'Сколько создать (по умолчанию '
+                                     f'{default})')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--images', type=float, default=0.0,
+                            help='Доля постов с картинкой, от 0 до 1')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней распределить посты')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if not 0 <= options['images'] <= 1:
+            raise CommandError('--images должен быть от 0 до 1')
+        if min(options[name] for name in synthetic.SIZES) < 0:
+            raise CommandError('Размеры не могут быть отрицательными')
+        # Посты и комментарии ссылаются на авторов, комментарии — на посты
+        if (options['posts'] or options['comments']) and not options['users']:
+            raise CommandError('Для постов и комментариев нужен хотя бы '
+                               'один пользователь (--users)')
+        if options['comments'] and not options['posts']:
+            raise CommandError('Для комментариев нужен хотя бы один пост '
+                               '(--posts)')
+        started = time.monotonic()
+        synthetic.generate(
+            {name: options[name] for name in synthetic.SIZES},
+            seed=options['seed'], images=options['images'],
+            days=options['days'], batch_size=options['batch_size'],
+            progress=self._progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с, '
+            f'пароль пользователей: {synthetic.PASSWORD}'))
+
+    def _progress(self, model, done, total):
+        suffix = f'/{total}' if total else ''
+        self.stdout.write(f'{model}: {done}{suffix}')
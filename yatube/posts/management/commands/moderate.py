@@ -0,0 +1,55 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import moderation
+from posts.models import Comment, Group, Post, User
+
+
+class Command(BaseCommand):
+    help = ('Массовая модерация пачками: перенос постов между группами, '
+            'удаление постов авторов, чистка комментариев за период')
+
+    def add_arguments(self, parser):
+        commands = parser.add_subparsers(dest='operation', required=True)
+        regroup = commands.add_parser(
+            'regroup', help='Перенести посты группы в другую группу')
+        regroup.add_argument('source', help='slug группы или - без группы')
+        regroup.add_argument('target', help='slug группы или - без группы')
+        delete = commands.add_parser(
+            'delete-author', help='Удалить все посты авторов')
+        delete.add_argument('usernames', nargs='+')
+        purge = commands.add_parser(
+            'purge-comments', help='Удалить комментарии за период')
+        purge.add_argument('--since', type=date.fromisoformat)
+        purge.add_argument('--until', type=date.fromisoformat)
+
+    def _group(self, slug):
+        if slug == '-':
+            return None
+        try:
+            return Group.objects.get(slug=slug)
+        except Group.DoesNotExist:
+            raise CommandError(f'Нет группы {slug}')
+
+    def _progress(self, done):
+        self.stdout.write(f'Обработано: {done}')
+
+    def handle(self, *args, **options):
+        operation = options['operation']
+        if operation == 'regroup':
+            source = self._group(options['source'])
+            done = moderation.regroup_posts(
+                Post.objects.filter(group=source),
+                self._group(options['target']), self._progress)
+        elif operation == 'delete-author':
+            authors = User.objects.filter(username__in=options['usernames'])
+            done = moderation.delete_posts_by_authors(
+                authors.values_list('pk', flat=True), self._progress)
+        else:
+            if options['since'] is None and options['until'] is None:
+                raise CommandError('Укажите --since и/или --until')
+            done = moderation.purge_comments(
+                Comment.objects.all(), options['since'], options['until'],
+                self._progress)
+        self.stdout.write(self.style.SUCCESS(f'Готово: {done}'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import rebuild_all
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает с нуля счетчики постов, комментариев и подписок'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_all()
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны'))
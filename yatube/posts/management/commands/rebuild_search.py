@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Строит заново поисковый индекс постов и комментариев'
+
+    def handle(self, *args, **options):
+        if not search.available():
+            raise CommandError('В базе нет таблиц FTS5, индекс не нужен')
+        with transaction.atomic():
+            search.rebuild()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс построен'))
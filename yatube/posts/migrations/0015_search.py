@@ -0,0 +1,58 @@
+from django.db import migrations
+
+TOKENIZE = "tokenize = 'unicode61 remove_diacritics 2'"
+
+
+def normalized(column):
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+GROUP = normalized("coalesce(g.title, '')")
+AUTHOR = normalized("u.username || ' ' || u.first_name || ' ' || u.last_name")
+
+
+def create_search_tables(apps, schema_editor):
+    """Таблицы FTS5 есть только в SQLite; в других СУБД поиск
+    работает без них (posts.search)"""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if not cursor.fetchone()[0]:
+            return
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE posts_search USING fts5('
+            f'text, author, grp, {TOKENIZE})')
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE comments_search USING fts5('
+            f'text, author, post_id UNINDEXED, {TOKENIZE})')
+        cursor.execute(
+            f"INSERT INTO posts_search (rowid, text, author, grp) "
+            f"SELECT p.id, {normalized('p.text')}, {AUTHOR}, "
+            f"{GROUP} "
+            f"FROM posts_post p JOIN auth_user u ON u.id = p.author_id "
+            f"LEFT JOIN posts_group g ON g.id = p.group_id")
+        cursor.execute(
+            f"INSERT INTO comments_search (rowid, text, author, post_id) "
+            f"SELECT c.id, {normalized('c.text')}, {AUTHOR}, c.post_id "
+            f"FROM posts_comment c JOIN auth_user u ON u.id = c.author_id")
+
+
+def drop_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS posts_search')
+        cursor.execute('DROP TABLE IF EXISTS comments_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_image_renditions'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
@@ -1,8 +1,36 @@
+import json
+
 from django.db import models
+from django.dispatch import Signal
+from django.utils.functional import cached_property
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+# Удалены комментарии; rows — пары (id комментария, id поста). У Comment
+# нет сигналов post_delete, поэтому при удалении поста или автора его
+# комментарии удаляются каскадом одним запросом, а остальные удаления
+# сообщают о себе этим сигналом один раз на вызов
+comments_deleted = Signal()
+
+# Поля, которые читают шаблоны лент; остальные колонки не выбираются
+FEED_FIELDS = (
+    'text', 'pub_date', 'image', 'author', 'group',
+    'author__username', 'author__first_name', 'author__last_name',
+    'group__slug', 'image_renditions',
+)
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для лент: автор и группа подтягиваются тем же запросом"""
+        return self.select_related('author', 'group').only(*FEED_FIELDS)
+
+    def for_detail(self):
+        """Пост для страницы поста: автор с его счетчиками и группа
+        тем же запросом"""
+        return self.select_related('author__counters', 'group')
+
 
 class Post(models.Model):
     text = models.TextField('Текст поста',
@@ -12,6 +40,7 @@ class Post(models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,  # покрыт индексом (author, pub_date)
         verbose_name='Автор',
         related_name='posts'
     )
@@ -20,6 +49,7 @@ class Post(models.Model):
         blank=True,
         null=True,
         on_delete=models.SET_NULL,
+        db_index=False,  # покрыт индексом (group, pub_date)
         related_name='posts',
         verbose_name='Группа',
         help_text='Группа, к которой будет относиться пост'
@@ -30,28 +60,88 @@ class Post(models.Model):
         blank=True,
         null=True,
     )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False,
+    )
+    image_renditions = models.TextField(
+        'Варианты картинки',
+        blank=True,
+        default='',
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        # Ленты сортируются по (-pub_date, -id): обратный проход по
+        # индексу (..., pub_date) отдает строки сразу в этом порядке
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_date_idx'),
+            models.Index(fields=['author', 'pub_date'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', 'pub_date'],
+                         name='post_group_date_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.text[:15]
 
+    @cached_property
+    def renditions(self):
+        """Готовые варианты картинки: имя -> url, width, height и
+        sources — те же варианты в дополнительных форматах.
+
+        Пусто, пока варианты не построены или если они остались
+        от прежней картинки.
+        """
+        if not self.image or not self.image_renditions:
+            return {}
+        data = json.loads(self.image_renditions)
+        if data.pop('source', None) != self.image.name:
+            return {}
+        storage = self.image.storage
+        return {
+            name: {
+                **rendition,
+                'url': storage.url(rendition['name']),
+                'sources': [{**source, 'url': storage.url(source['name'])}
+                            for source in rendition.get('sources', ())],
+            }
+            for name, rendition in data.items()
+        }
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(
+        'Количество постов',
+        default=0,
+        editable=False,
+    )
 
     def __str__(self) -> str:
         return self.title
 
 
+class CommentQuerySet(models.QuerySet):
+    def delete(self):
+        rows = list(self.values_list('pk', 'post_id'))
+        result = super().delete()
+        comments_deleted.send(sender=self.model, rows=rows)
+        return result
+
+
 class Comment(models.Model):
     post = models.ForeignKey(
         'Post',
         related_name='comments',
         on_delete=models.CASCADE,
+        db_index=False,  # покрыт индексом (post, created)
         verbose_name='Текст поста'
     )
     author = models.ForeignKey(
@@ -69,23 +159,35 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         ordering = ['created']
+        indexes = [models.Index(fields=['post', 'created'],
+                                name='comment_post_created_idx')]
 
     def __str__(self) -> str:
         return self.text[:15]
 
+    def delete(self, *args, **kwargs):
+        rows = [(self.pk, self.post_id)]
+        result = super().delete(*args, **kwargs)
+        comments_deleted.send(sender=Comment, rows=rows)
+        return result
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,  # покрыт уникальным индексом (user, author)
         verbose_name='Подписчик',
         related_name='follower'
     )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,  # покрыт индексом (author, user)
         verbose_name='Автор',
         related_name='following'
     )
@@ -93,5 +195,81 @@ class Follow(models.Model):
     class Meta:
         ordering = ['author']
         verbose_name = 'Подписки'
+        indexes = [models.Index(fields=['author', 'user'],
+                                name='follow_author_user_idx')]
         constraints = [models.UniqueConstraint(fields=['user', 'author'],
                                                name='unique_follow')]
+
+
+class AuthorCounters(models.Model):
+    """Счетчики пользователя, которые поддерживают сигналы posts.signals"""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Пользователь',
+        related_name='counters'
+    )
+    posts_count = models.PositiveIntegerField('Количество постов',
+                                              default=0)
+    followers_count = models.PositiveIntegerField('Количество подписчиков',
+                                                  default=0)
+    following_count = models.PositiveIntegerField('Количество подписок',
+                                                  default=0)
+
+    class Meta:
+        verbose_name = 'Счетчики автора'
+
+    def __str__(self) -> str:
+        return str(self.user)
+
+
+class TimelineQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Записи ленты подписок вместе с постами, их авторами и группами"""
+        return self.select_related('post__author', 'post__group').only(
+            'pub_date', 'post', *(f'post__{field}' for field in FEED_FIELDS)
+        )
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписок пользователя.
+
+    Записи раскладываются при публикации поста и при подписке
+    (posts.timeline), поэтому лента читается одним проходом по индексу
+    (user, pub_date) без соединения с Follow.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        db_index=False,  # покрыт индексом (user, pub_date)
+        verbose_name='Подписчик',
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        verbose_name='Пост',
+        related_name='timeline_entries'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Автор',
+        related_name='+'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    objects = TimelineQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-pub_date']
+        verbose_name = 'Лента подписок'
+        indexes = [
+            models.Index(fields=['user', 'pub_date'],
+                         name='timeline_user_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
+        constraints = [models.UniqueConstraint(fields=['user', 'post'],
+                                               name='unique_timeline_post')]
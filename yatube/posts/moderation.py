@@ -0,0 +1,128 @@
+"""Массовая модерация постов и комментариев.
+
+Операции идут пачками по MODERATION_BATCH_SIZE записей в порядке
+первичного ключа: каждая пачка — один UPDATE или DELETE в своей
+транзакции, с отключенной обработкой в posts.signals (muted).
+Производные данные — счетчики, поисковый индекс и поколения кэша
+лент — обновляются один раз на пачку. После каждой пачки вызывается
+progress(обработано), а итог пишется в лог.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from . import counters, feed_cache, search, signals
+from .models import Comment, Group, Post, User
+
+logger = logging.getLogger(__name__)
+
+
+def _batches(queryset, *fields):
+    """Пачки значений fields из queryset по возрастанию pk.
+
+    Следующая пачка начинается после последнего pk предыдущей, поэтому
+    измененные и удаленные строки не сдвигают выборку.
+    """
+    last = None
+    while True:
+        batch = queryset.order_by('pk')
+        if last is not None:
+            batch = batch.filter(pk__gt=last)
+        rows = list(batch.values_list('pk', *fields)
+                    [:settings.MODERATION_BATCH_SIZE])
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0]
+
+
+def _run(name, queryset, fields, handle, progress):
+    done = 0
+    for rows in _batches(queryset, *fields):
+        handle(rows)
+        done += len(rows)
+        if progress is not None:
+            progress(done)
+    logger.info('%s: обработано %d записей', name, done)
+    return done
+
+
+def regroup_posts(posts, group, progress=None):
+    """Переносит посты в группу group (None — убрать из групп).
+
+    Возвращает число перенесенных постов.
+    """
+    group_id = group.pk if group is not None else None
+
+    def handle(rows):
+        ids = [pk for pk, _, _ in rows]
+        with transaction.atomic():
+            Post.objects.filter(pk__in=ids).update(group_id=group_id)
+            counters.rebuild_groups(Group.objects.filter(
+                pk__in={old for _, _, old in rows} | {group_id}))
+            search.reindex_post_ids(ids)
+        # Страница поста зависит от поколения автора
+        feed_cache.bump(
+            feed_cache.index_scope(),
+            *{feed_cache.author_scope(author) for _, author, _ in rows},
+            *{feed_cache.group_scope(pk) for pk in
+              {old for _, _, old in rows} | {group_id} if pk is not None})
+
+    return _run('regroup_posts', posts.exclude(group_id=group_id),
+                ('author_id', 'group_id'), handle, progress)
+
+
+def delete_posts(posts, progress=None):
+    """Удаляет посты вместе с комментариями и записями лент подписок.
+
+    Возвращает число удаленных постов.
+    """
+    def handle(rows):
+        ids = [pk for pk, _, _ in rows]
+        with transaction.atomic():
+            # Комментарии и записи лент удаляются каскадом
+            with signals.muted():
+                Post.objects.filter(pk__in=ids).delete()
+            counters.rebuild_authors(User.objects.filter(
+                pk__in={author for _, author, _ in rows}))
+            counters.rebuild_groups(Group.objects.filter(
+                pk__in={group for _, _, group in rows}))
+            search.delete_posts(ids)
+        feed_cache.bump(
+            feed_cache.index_scope(),
+            *{feed_cache.author_scope(author) for _, author, _ in rows},
+            *{feed_cache.group_scope(group) for _, _, group in rows
+              if group is not None})
+
+    return _run('delete_posts', posts, ('author_id', 'group_id'), handle,
+                progress)
+
+
+def delete_posts_by_authors(author_ids, progress=None):
+    """Удаляет все посты авторов author_ids"""
+    return delete_posts(Post.objects.filter(author_id__in=author_ids),
+                        progress)
+
+
+def purge_comments(comments, since=None, until=None, progress=None):
+    """Удаляет комментарии, оставленные с since по until включительно.
+
+    Возвращает число удаленных комментариев.
+    """
+    if since is not None:
+        comments = comments.filter(created__date__gte=since)
+    if until is not None:
+        comments = comments.filter(created__date__lte=until)
+
+    def handle(rows):
+        ids = [pk for pk, _ in rows]
+        post_ids = {post for _, post in rows}
+        with transaction.atomic():
+            with signals.muted():
+                Comment.objects.filter(pk__in=ids).delete()
+            counters.rebuild_posts(Post.objects.filter(pk__in=post_ids))
+            search.delete_comments(ids)
+        feed_cache.bump(*(feed_cache.post_scope(pk) for pk in post_ids))
+
+    return _run('purge_comments', comments, ('post_id',), handle, progress)
@@ -0,0 +1,80 @@
+"""Способы узнать число записей ленты для нумерованных страниц.
+
+Каждый способ — объект с методом count(queryset), который возвращает
+пару (число, точное ли оно). WindowPaginator берет число отсюда вместо
+COUNT(*) на каждый просмотр, а если оно неточное и читатель дошел до
+конца известных страниц, пересчитывает точно.
+"""
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+
+class ExactCount:
+    """Обычный COUNT(*) на каждый запрос"""
+
+    def count(self, queryset):
+        return queryset.count(), True
+
+
+class CachedCount:
+    """COUNT(*), который хранится в кэше timeout секунд"""
+
+    def __init__(self, key, timeout=None):
+        self.key = f'feed-count:{key}'
+        self.timeout = (settings.FEED_COUNT_TIMEOUT if timeout is None
+                        else timeout)
+
+    def count(self, queryset):
+        value = cache.get(self.key)
+        if value is None:
+            value = queryset.count()
+            cache.set(self.key, value, self.timeout)
+        return value, False
+
+
+class CounterCount:
+    """Число из таблицы счетчиков (posts.counters), без запроса к ленте"""
+
+    def __init__(self, get_value):
+        self.get_value = get_value
+
+    def count(self, queryset):
+        return self.get_value(), True
+
+
+class CappedCount:
+    """Считает не больше cap + 1 записей: «10 000+» вместо точного числа"""
+
+    def __init__(self, cap=None):
+        self.cap = settings.FEED_COUNT_CAP if cap is None else cap
+
+    def count(self, queryset):
+        value = queryset[:self.cap + 1].count()
+        return value, value <= self.cap
+
+
+class EstimatedCount:
+    """Приблизительное число записей любого queryset для админки.
+
+    Для таблицы без фильтров в PostgreSQL это оценка планировщика
+    (pg_class.reltuples), в остальных случаях — COUNT(*), который
+    хранится в кэше по тексту запроса.
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+
+    def count(self, queryset):
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class '
+                    'WHERE relname = %s', [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] > 0:
+                return row[0], False
+        key = md5(str(queryset.query).encode()).hexdigest()
+        return CachedCount(f'estimated:{key}', self.timeout).count(queryset)
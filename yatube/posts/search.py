@@ -0,0 +1,295 @@
+"""Полнотекстовый поиск по постам.
+
+В SQLite посты и комментарии лежат в виртуальных таблицах FTS5
+(миграция 0015_search): posts_search — текст поста, автор и название
+группы (rowid = id поста), comments_search — текст и автор комментария
+(rowid = id комментария). Сигналы posts.signals держат их в актуальном
+состоянии, а search() ранжирует посты по bm25: совпадение в самом
+посте весит больше, чем в комментарии к нему.
+
+В других СУБД таблиц нет, и поиск идет обычным icontains по тем же
+полям, новые посты сверху.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .models import Comment, Post
+from .utils import CursorPaginator
+
+TOKEN = re.compile(r'\w+')
+
+# Вес совпадений в комментариях относительно совпадений в посте
+COMMENT_WEIGHT = 0.5
+
+SEARCH_SQL = f'''
+    SELECT post_id, MIN(score) AS score FROM (
+        SELECT rowid AS post_id,
+               bm25(posts_search, 1.0, 2.0, 2.0) AS score
+        FROM posts_search WHERE posts_search MATCH %s
+        UNION ALL
+        SELECT post_id, bm25(comments_search) * {COMMENT_WEIGHT} AS score
+        FROM comments_search WHERE comments_search MATCH %s
+    )
+    GROUP BY post_id
+    {{having}}
+    ORDER BY score, post_id
+    LIMIT %s
+'''
+
+
+def _normalized_sql(column):
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+_AUTHOR_SQL = _normalized_sql(
+    "trim(u.username || ' ' || u.first_name || ' ' || u.last_name)")
+
+# Полная перестройка одним INSERT ... SELECT на таблицу
+REBUILD_POSTS_SQL = f'''
+    INSERT INTO posts_search (rowid, text, author, grp)
+    SELECT p.id, {_normalized_sql('p.text')}, {_AUTHOR_SQL},
+           {_normalized_sql("coalesce(g.title, '')")}
+    FROM posts_post p JOIN auth_user u ON u.id = p.author_id
+    LEFT JOIN posts_group g ON g.id = p.group_id
+'''
+REBUILD_COMMENTS_SQL = f'''
+    INSERT INTO comments_search (rowid, text, author, post_id)
+    SELECT c.id, {_normalized_sql('c.text')}, {_AUTHOR_SQL}, c.post_id
+    FROM posts_comment c JOIN auth_user u ON u.id = c.author_id
+'''
+
+_available = None
+
+
+def available():
+    """Есть ли в базе таблицы FTS5"""
+    global _available
+    if _available is None:
+        _available = (connection.vendor == 'sqlite'
+                      and 'posts_search' in connection.introspection
+                      .table_names(include_views=True))
+    return _available
+
+
+def _normalize(text):
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def _author(user):
+    return _normalize(' '.join(filter(None, (
+        user.username, user.first_name, user.last_name))))
+
+
+def match_expression(query):
+    """Запрос пользователя в синтаксисе FTS5: все слова, каждое как
+    префикс. Спецсимволы FTS5 из запроса не проходят"""
+    tokens = TOKEN.findall(_normalize(query))
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def index_post(post):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM posts_search WHERE rowid = %s',
+                       [post.pk])
+        cursor.execute(
+            'INSERT INTO posts_search (rowid, text, author, grp) '
+            'VALUES (%s, %s, %s, %s)',
+            [post.pk, _normalize(post.text), _author(post.author),
+             _normalize(post.group.title) if post.group_id else ''])
+
+
+def delete_post(post_id):
+    if available():
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_search WHERE rowid = %s',
+                           [post_id])
+
+
+def index_comment(comment):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM comments_search WHERE rowid = %s',
+                       [comment.pk])
+        cursor.execute(
+            'INSERT INTO comments_search (rowid, text, author, post_id) '
+            'VALUES (%s, %s, %s, %s)',
+            [comment.pk, _normalize(comment.text), _author(comment.author),
+             comment.post_id])
+
+
+def delete_comment(comment_id):
+    if available():
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM comments_search WHERE rowid = %s',
+                           [comment_id])
+
+
+def _delete_rows(table, column, ids):
+    ids = list(ids)
+    if not ids or not available():
+        return
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE {column} IN ({placeholders})', ids)
+
+
+def delete_posts(post_ids):
+    """Убирает из индекса посты вместе с комментариями к ним"""
+    post_ids = list(post_ids)
+    _delete_rows('posts_search', 'rowid', post_ids)
+    _delete_rows('comments_search', 'post_id', post_ids)
+
+
+def delete_comments(comment_ids):
+    _delete_rows('comments_search', 'rowid', comment_ids)
+
+
+def _reindex(table, source, sql, where, params):
+    """Переиндексирует строки source (алиас p или c), отобранные where:
+    один DELETE и один INSERT ... SELECT"""
+    if not available():
+        return
+    alias = where.split('.', 1)[0]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE rowid IN '
+            f'(SELECT {alias}.id FROM {source} {alias} WHERE {where})',
+            params)
+        cursor.execute(f'{sql} WHERE {where}', params)
+
+
+def _reindex_posts(where, params):
+    _reindex('posts_search', 'posts_post', REBUILD_POSTS_SQL, where, params)
+
+
+def reindex_post_ids(post_ids):
+    """Переиндексирует посты с id из post_ids"""
+    post_ids = list(post_ids)
+    if post_ids:
+        placeholders = ', '.join(['%s'] * len(post_ids))
+        _reindex_posts(f'p.id IN ({placeholders})', post_ids)
+
+
+def reindex_group(group_id):
+    """Переиндексирует посты группы после смены ее названия"""
+    _reindex_posts('p.group_id = %s', [group_id])
+
+
+def reindex_author(user_id):
+    """Переиндексирует посты и комментарии автора после смены имени"""
+    _reindex_posts('p.author_id = %s', [user_id])
+    _reindex('comments_search', 'posts_comment', REBUILD_COMMENTS_SQL,
+             'c.author_id = %s', [user_id])
+
+
+def rebuild():
+    """Строит индекс заново по всем постам и комментариям"""
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM posts_search')
+        cursor.execute('DELETE FROM comments_search')
+        cursor.execute(REBUILD_POSTS_SQL)
+        cursor.execute(REBUILD_COMMENTS_SQL)
+
+
+def _index_rows(sql, where, params):
+    """Дописывает в индекс строки запроса перестройки, отобранные where"""
+    if available():
+        with connection.cursor() as cursor:
+            cursor.execute(f'{sql} WHERE {where}', params)
+
+
+def index_new_comments(after_pk):
+    """Индексирует одним запросом комментарии с pk больше after_pk,
+    которых еще нет в индексе"""
+    _index_rows(REBUILD_COMMENTS_SQL,
+                'c.id > %s AND c.id NOT IN (SELECT rowid FROM '
+                'comments_search WHERE rowid > %s)',
+                [after_pk, after_pk])
+
+
+def encode_cursor(score, post_id):
+    return urlsafe_base64_encode(f'{score!r}|{post_id}'.encode())
+
+
+def decode_cursor(cursor):
+    try:
+        score, post_id = urlsafe_base64_decode(cursor).decode().split('|')
+        return float(score), int(post_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _ranked_ids(expression, after, limit):
+    having, params = '', [expression, expression]
+    if after is not None:
+        having = 'HAVING score > %s OR (score = %s AND post_id > %s)'
+        params += [after[0], after[0], after[1]]
+    with connection.cursor() as cursor:
+        cursor.execute(SEARCH_SQL.format(having=having), [*params, limit])
+        return cursor.fetchall()
+
+
+class _Subquery(RawSQL):
+    """Подзапрос для pk__in: скобки вокруг него ставит сам lookup, а
+    RawSQL добавил бы вторые, и SQLite взял бы только первую строку"""
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+def filter_queryset(queryset, query):
+    """Оставляет в queryset постов или комментариев найденные в индексе.
+
+    Подзапрос к FTS5 сочетается с любыми фильтрами и сортировкой
+    queryset, например в списках админки.
+    """
+    model = queryset.model
+    table = {Post: 'posts_search', Comment: 'comments_search'}[model]
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    return queryset.filter(pk__in=_Subquery(
+        f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [expression]))
+
+
+def _fallback_queryset(query):
+    condition = Q()
+    for token in TOKEN.findall(query):
+        condition &= (Q(text__icontains=token)
+                      | Q(comments__text__icontains=token)
+                      | Q(group__title__icontains=token)
+                      | Q(author__username__icontains=token))
+    return Post.objects.filter(condition).distinct()
+
+
+def search(query, per_page, after=None):
+    """Страница результатов: (посты, курсор следующей страницы или None)"""
+    expression = match_expression(query)
+    if not expression:
+        return [], None
+    if not available():
+        paginator = CursorPaginator(_fallback_queryset(query).for_feed(),
+                                    per_page)
+        page = paginator.get_cursor_page(after)
+        return list(page), page.next_cursor
+    after_key = decode_cursor(after) if after else None
+    rows = _ranked_ids(expression, after_key, per_page + 1)
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    posts = Post.objects.for_feed().in_bulk([post_id for post_id, _ in rows])
+    results = [posts[post_id] for post_id, _ in rows if post_id in posts]
+    next_cursor = None
+    if has_next:
+        post_id, score = rows[-1]
+        next_cursor = encode_cursor(score, post_id)
+    return results, next_cursor
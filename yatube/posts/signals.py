@@ -0,0 +1,203 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import counters, feed_cache, search, timeline
+from .models import Comment, Follow, Group, Post, User, comments_deleted
+
+# Поля пользователя, которые попадают в поисковый индекс
+SEARCH_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+_state = threading.local()
+
+
+@contextmanager
+def muted():
+    """Отключает обработку удалений: вызывающий код (массовая модерация,
+    отложенная запись) сам обновляет производные данные пачкой"""
+    previous = getattr(_state, 'muted', False)
+    _state.muted = True
+    try:
+        yield
+    finally:
+        _state.muted = previous
+
+
+def _muted():
+    return getattr(_state, 'muted', False)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_relations(sender, instance, **kwargs):
+    """Запоминает автора и группу поста до редактирования"""
+    instance._saved_relations = (
+        Post.objects.filter(pk=instance.pk)
+        .values_list('author_id', 'group_id').first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    saved = getattr(instance, '_saved_relations', None)
+    if created or saved is None:
+        counters.shift_author(instance.author_id, 'posts_count', 1)
+        counters.shift_group(instance.group_id, 1)
+        timeline.fan_out(instance)
+        feed_cache.bump_post(instance)
+        search.index_post(instance)
+        return
+    author_id, group_id = saved
+    if author_id != instance.author_id:
+        counters.shift_author(author_id, 'posts_count', -1)
+        counters.shift_author(instance.author_id, 'posts_count', 1)
+        feed_cache.bump(feed_cache.author_scope(author_id))
+    if group_id != instance.group_id:
+        counters.shift_group(group_id, -1)
+        counters.shift_group(instance.group_id, 1)
+    feed_cache.bump_post(instance, group_id)
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    """Комментарии поста удалены каскадом одним запросом; из индекса
+    они убираются вместе с постом"""
+    if _muted():
+        return
+    search.delete_posts([instance.pk])
+    counters.shift_author(instance.author_id, 'posts_count', -1)
+    counters.shift_group(instance.group_id, -1)
+    feed_cache.bump_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.shift_post(instance.post_id, 1)
+    feed_cache.bump(feed_cache.post_scope(instance.post_id))
+    search.index_comment(instance)
+
+
+@receiver(comments_deleted)
+def comments_removed(sender, rows, **kwargs):
+    """Пересчитывает комментарии затронутых постов одним запросом"""
+    if _muted() or not rows:
+        return
+    post_ids = {post_id for _, post_id in rows}
+    counters.rebuild_posts(Post.objects.filter(pk__in=post_ids))
+    search.delete_comments([pk for pk, _ in rows])
+    feed_cache.bump(*(feed_cache.post_scope(pk) for pk in post_ids))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.shift_author(instance.author_id, 'followers_count', 1)
+        counters.shift_author(instance.user_id, 'following_count', 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        # Профиль автора показывает число подписчиков и кнопку подписки,
+        # профиль подписчика — число подписок
+        feed_cache.bump(feed_cache.author_scope(instance.author_id),
+                        feed_cache.author_scope(instance.user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    if _muted():
+        return
+    counters.shift_author(instance.author_id, 'followers_count', -1)
+    counters.shift_author(instance.user_id, 'following_count', -1)
+    timeline.trim(instance.user_id, instance.author_id)
+    feed_cache.bump(feed_cache.author_scope(instance.author_id),
+                    feed_cache.author_scope(instance.user_id))
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_names(sender, instance, **kwargs):
+    """Запоминает название и slug группы до редактирования"""
+    instance._saved_names = (
+        Group.objects.filter(pk=instance.pk)
+        .values_list('title', 'slug').first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    saved = getattr(instance, '_saved_names', None)
+    if saved == (instance.title, instance.slug):
+        feed_cache.bump(feed_cache.group_scope(instance.pk))
+        return
+    # Ссылки на группу и ее название есть в лентах и на страницах постов
+    feed_cache.bump(feed_cache.group_scope(instance.pk),
+                    feed_cache.names_scope())
+    if saved is None or saved[0] != instance.title:
+        search.reindex_group(instance.pk)
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_posts(sender, instance, **kwargs):
+    instance._post_ids = list(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    """Посты удаленной группы остаются без группы"""
+    feed_cache.bump(feed_cache.group_scope(instance.pk),
+                    feed_cache.names_scope())
+    search.reindex_post_ids(getattr(instance, '_post_ids', []))
+
+
+def _user_names(user):
+    return tuple(getattr(user, field) for field in sorted(SEARCH_USER_FIELDS))
+
+
+@receiver(pre_save, sender=User)
+def remember_user_names(sender, instance, update_fields=None, **kwargs):
+    """Запоминает имя пользователя до сохранения, если оно может
+    измениться"""
+    instance._saved_names = None
+    if instance.pk is None:
+        return
+    if update_fields is not None and not (SEARCH_USER_FIELDS
+                                          & set(update_fields)):
+        return
+    saved = User.objects.filter(pk=instance.pk).first()
+    if saved is not None:
+        instance._saved_names = _user_names(saved)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    """Переиндексирует записи автора, если сменилось его имя"""
+    saved = getattr(instance, '_saved_names', None)
+    if created or raw or saved is None:
+        return
+    if saved != _user_names(instance):
+        search.reindex_author(instance.pk)
+        # Имя автора выводят ленты, профиль, страницы постов и комментарии
+        feed_cache.bump(feed_cache.names_scope())
+
+
+@receiver(pre_delete, sender=User)
+def remember_user_comments(sender, instance, **kwargs):
+    """Запоминает комментарии пользователя: каскад удалит их одним
+    запросом без сигналов"""
+    instance._deleted_comments = list(
+        Comment.objects.filter(author_id=instance.pk)
+        .values_list('pk', 'post_id'))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    comments_removed(Comment, getattr(instance, '_deleted_comments', []))
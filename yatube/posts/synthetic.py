@@ -0,0 +1,268 @@
+"""Синтетические данные производственного масштаба.
+
+generate() создает пользователей, группы, посты (по желанию
+с картинками), комментарии и подписки потоком: объекты строятся
+генераторами и пишутся bulk_create пачками по batch_size, в памяти
+держится только текущая пачка. Первичные ключи назначаются заранее,
+поэтому связи строятся без чтения созданных строк обратно.
+
+Все случайные значения берутся из random.Random(seed) и из пулов слов
+и имен, заранее сгенерированных Faker с тем же seed, так что один seed
+всегда дает одни и те же данные. Популярность авторов — усеченный
+закон Ципфа: немногие авторы пишут большую часть постов и собирают
+большую часть подписчиков, как на настоящей площадке.
+"""
+import io
+import math
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from . import counters, search, timeline
+from .models import AuthorCounters, Comment, Follow, Group, Post, User
+
+SIZES = {
+    'users': 10_000,
+    'groups': 50,
+    'posts': 100_000,
+    'comments': 300_000,
+    'follows': 200_000,
+}
+
+# Показатель закона Ципфа для популярности авторов
+ZIPF_EXPONENT = 1.1
+
+POOL_SIZE = 500
+IMAGE_COUNT = 20
+IMAGE_DIR = 'posts/synthetic'
+
+# Общий пароль всех созданных пользователей
+PASSWORD = 'synthetic'
+
+
+class ZipfSampler:
+    """Ранги 1..n с вероятностью ~ 1 / rank ** exponent.
+
+    Обратная функция распределения непрерывного приближения: выборка
+    за O(1) без таблицы весов на n элементов.
+    """
+
+    def __init__(self, n, exponent, rng):
+        self.n = n
+        self.exponent = exponent
+        self.rng = rng
+
+    def __call__(self):
+        u = self.rng.random()
+        if self.exponent == 1:
+            rank = math.exp(u * math.log(self.n + 1))
+        else:
+            power = 1 - self.exponent
+            rank = ((self.n + 1) ** power - 1) * u + 1
+            rank **= 1 / power
+        return min(self.n, int(rank))
+
+
+@contextmanager
+def _explicit_dates(*fields):
+    """Временно отключает auto_now_add, чтобы записать даты из прошлого"""
+    saved = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, saved):
+            field.auto_now_add = value
+
+
+class Generator:
+    def __init__(self, sizes, seed=0, images=0.0, days=365,
+                 batch_size=5000, progress=None):
+        self.sizes = sizes
+        self.rng = random.Random(seed)
+        self.images = images
+        self.batch_size = batch_size
+        self.progress = progress
+        self.now = timezone.now()
+        self.span = timedelta(days=days)
+        faker = Faker('ru_RU')
+        faker.seed_instance(seed)
+        self.sentences = [faker.sentence(nb_words=10)
+                          for _ in range(POOL_SIZE)]
+        self.first_names = [faker.first_name() for _ in range(POOL_SIZE)]
+        self.last_names = [faker.last_name() for _ in range(POOL_SIZE)]
+        self.titles = [faker.catch_phrase() for _ in range(POOL_SIZE)]
+        self.start = {model: (model.objects.aggregate(Max('pk'))['pk__max']
+                              or 0) + 1
+                      for model in (User, Group, Post, Comment, Follow)}
+
+    def _text(self, low, high):
+        return ' '.join(self.rng.choices(self.sentences,
+                                         k=self.rng.randint(low, high)))
+
+    def _save(self, model, objects, total):
+        objects = iter(objects)
+        done = 0
+        while True:
+            batch = list(islice(objects, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            done += len(batch)
+            if self.progress is not None:
+                self.progress(model.__name__, done, total)
+
+    def _post_date(self, index):
+        """Посты равномерно по времени: индекс поста задает его дату"""
+        step = self.span / max(1, self.sizes['posts'])
+        return self.now - self.span + step * index
+
+    def users(self):
+        password = make_password(PASSWORD)
+        start = self.start[User]
+        for pk in range(start, start + self.sizes['users']):
+            yield User(pk=pk, username=f'user{pk}', password=password,
+                       first_name=self.rng.choice(self.first_names),
+                       last_name=self.rng.choice(self.last_names),
+                       date_joined=self.now - self.span)
+
+    def author_counters(self):
+        """Пустые строки счетчиков: rebuild_all только пересчитает их"""
+        start = self.start[User]
+        for pk in range(start, start + self.sizes['users']):
+            yield AuthorCounters(user_id=pk)
+
+    def groups(self):
+        start = self.start[Group]
+        for pk in range(start, start + self.sizes['groups']):
+            yield Group(pk=pk, slug=f'group-{pk}',
+                        title=self.rng.choice(self.titles)[:200],
+                        description=self._text(1, 3))
+
+    def _image_names(self):
+        """Небольшой набор картинок, общий для всех постов"""
+        names = []
+        for index in range(IMAGE_COUNT):
+            name = f'{IMAGE_DIR}/{index}.jpg'
+            if not default_storage.exists(name):
+                color = tuple(self.rng.randrange(256) for _ in range(3))
+                buffer = io.BytesIO()
+                Image.new('RGB', (960, 540), color).save(buffer, 'JPEG')
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+            names.append(name)
+        return names
+
+    def posts(self):
+        authors = ZipfSampler(self.sizes['users'], ZIPF_EXPONENT, self.rng)
+        user_start = self.start[User]
+        group_start = self.start[Group]
+        images = self._image_names() if self.images else []
+        start = self.start[Post]
+        for index in range(self.sizes['posts']):
+            group_id = None
+            if self.sizes['groups'] and self.rng.random() < 0.7:
+                group_id = group_start + self.rng.randrange(
+                    self.sizes['groups'])
+            image = ''
+            if images and self.rng.random() < self.images:
+                image = self.rng.choice(images)
+            yield Post(pk=start + index, text=self._text(1, 6),
+                       author_id=user_start + authors() - 1,
+                       group_id=group_id, image=image,
+                       pub_date=self._post_date(index))
+
+    def comments(self):
+        # Свежие посты комментируют чаще старых
+        posts = ZipfSampler(self.sizes['posts'], 0.8, self.rng)
+        user_start = self.start[User]
+        post_start = self.start[Post]
+        start = self.start[Comment]
+        for index in range(self.sizes['comments']):
+            post_index = self.sizes['posts'] - posts()
+            posted = self._post_date(post_index)
+            created = posted + (self.now - posted) * self.rng.random()
+            yield Comment(pk=start + index, post_id=post_start + post_index,
+                          author_id=user_start + self.rng.randrange(
+                              self.sizes['users']),
+                          text=self._text(1, 2), created=created)
+
+    def follows(self):
+        """Подписки по читателям: у каждого случайное число авторов,
+        авторы выбираются по популярности"""
+        users = self.sizes['users']
+        if users < 2:
+            return
+        authors = ZipfSampler(users, ZIPF_EXPONENT, self.rng)
+        mean = self.sizes['follows'] / users
+        user_start = self.start[User]
+        pk = self.start[Follow]
+        left = self.sizes['follows']
+        for reader in range(users):
+            wanted = min(left, users - 1,
+                         round(self.rng.expovariate(1 / mean)) if mean else 0)
+            chosen = set()
+            # Популярные авторы выпадают часто; попытки ограничены
+            for _ in range(wanted * 4):
+                if len(chosen) >= wanted:
+                    break
+                author = authors() - 1
+                if author != reader:
+                    chosen.add(author)
+            for author in sorted(chosen):
+                yield Follow(pk=pk, user_id=user_start + reader,
+                             author_id=user_start + author)
+                pk += 1
+            left -= len(chosen)
+            if not left:
+                return
+
+    def run(self):
+        self._save(User, self.users(), self.sizes['users'])
+        self._save(AuthorCounters, self.author_counters(),
+                   self.sizes['users'])
+        self._save(Group, self.groups(), self.sizes['groups'])
+        with _explicit_dates(Post._meta.get_field('pub_date'),
+                             Comment._meta.get_field('created')):
+            self._save(Post, self.posts(), self.sizes['posts'])
+            self._save(Comment, self.comments(), self.sizes['comments'])
+        self._save(Follow, self.follows(), self.sizes['follows'])
+        self._reset_sequences()
+        self._derived()
+
+    def _reset_sequences(self):
+        """Явные pk не двигают последовательности PostgreSQL"""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Group, Post, Comment, Follow])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def _derived(self):
+        """Счетчики, ленты подписок и поисковый индекс — после вставки"""
+        with transaction.atomic():
+            counters.rebuild_all()
+        with transaction.atomic():
+            timeline.backfill_follows(
+                Follow.objects.filter(pk__gte=self.start[Follow]))
+        if self.progress is not None:
+            self.progress('TimelineEntry', self.sizes['follows'], None)
+        with transaction.atomic():
+            search.rebuild()
+
+
+def generate(sizes=None, **options):
+    """Создает синтетические данные; размеры по умолчанию — SIZES"""
+    Generator({**SIZES, **(sizes or {})}, **options).run()
@@ -0,0 +1,29 @@
+from django import template
+
+from posts.thumbnails import prefetch
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts):
+    """Готовит миниатюры для всей страницы постов одним запросом.
+
+    Ставится внутри {% cache %}, чтобы не работать при попадании в кэш.
+    """
+    prefetch(posts)
+    return ''
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def picture(rendition, retina=None):
+    """Вариант картинки с источниками в дополнительных форматах"""
+    retina_urls = ({source['type']: source['url']
+                    for source in retina['sources']} if retina else {})
+    sources = []
+    for source in rendition['sources']:
+        srcset = source['url']
+        if source['type'] in retina_urls:
+            srcset += f', {retina_urls[source["type"]]} 2x'
+        sources.append({'type': source['type'], 'srcset': srcset})
+    return {'rendition': rendition, 'retina': retina, 'sources': sources}
@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Group, Post, User
+
+
+class AdminChangelistTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def add_posts(self, number, start=0):
+        for i in range(start, start + number):
+            post = Post.objects.create(author=self.admin, group=self.group,
+                                       text=f'Пост номер {i}')
+            Comment.objects.create(post=post, author=self.admin,
+                                   text=f'Комментарий {i}')
+
+    def count_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_depend_on_rows(self):
+        """Число запросов списка не растет вместе с числом строк"""
+        for name in ('admin:posts_post_changelist',
+                     'admin:posts_comment_changelist'):
+            with self.subTest(name=name):
+                url = reverse(name)
+                self.add_posts(2, start=0 if 'post_' in name else 100)
+                cache.clear()
+                few = self.count_queries(url)
+                self.add_posts(5, start=10 if 'post_' in name else 110)
+                cache.clear()
+                self.assertEqual(self.count_queries(url), few)
+
+    def test_count_is_cached(self):
+        """Число записей списка считается один раз на время кэша"""
+        self.add_posts(3)
+        url = reverse('admin:posts_post_changelist')
+        first = self.count_queries(url)
+        self.assertEqual(self.count_queries(url), first - 1)
+
+    def test_search_uses_index(self):
+        """Поиск в админке находит записи через FTS5"""
+        self.add_posts(3)
+        response = self.client.get(reverse('admin:posts_post_changelist'),
+                                   {'q': 'номер 1'})
+        self.assertEqual(
+            [post.text for post in response.context['cl'].result_list],
+            ['Пост номер 1'])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('admin:posts_comment_changelist'),
+                {'q': 'комментарий'})
+        self.assertEqual(len(response.context['cl'].result_list), 3)
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertIn('MATCH', sql)
+        self.assertNotIn('LIKE', sql)
@@ -0,0 +1,91 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from .. import benchmark
+from ..models import Comment, Follow, Group, Post, TimelineEntry, User
+
+SIZES = {'users': 5, 'groups': 2, 'posts': 30, 'comments': 40, 'follows': 6}
+
+
+class BenchmarkTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        benchmark.seed(SIZES, seed_value=1)
+
+    def test_seed_creates_sizes(self):
+        """Набор данных нужного размера, счетчики и ленты построены"""
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(Group.objects.count(), 2)
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+        self.assertEqual(sum(Group.objects.values_list('posts_count',
+                                                       flat=True)),
+                         Post.objects.filter(group__isnull=False).count())
+
+    def test_seed_is_reproducible(self):
+        """С тем же seed получаются те же данные"""
+        def dataset():
+            return list(Post.objects.order_by('pk').values_list(
+                'text', 'author__username', 'group__slug'))
+        first = dataset()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        benchmark.seed(SIZES, seed_value=1)
+        self.assertEqual(dataset(), first)
+
+    def test_every_route_has_scenario(self):
+        """Для каждого маршрута posts есть сценарий"""
+        scenarios = benchmark.scenarios(benchmark.Fixtures())
+        self.assertEqual(benchmark.missing_routes(scenarios), [])
+
+    def test_run_reports_latency_and_queries(self):
+        """Сценарии отдают перцентили, запросы и статусы"""
+        results = benchmark.run(3, warmup=0,
+                                only=['index', 'post_delete'])
+        self.assertEqual(set(results),
+                         {'index', 'index (auth)', 'post_delete'})
+        self.assertEqual(results['index']['statuses'], {'200': 3})
+        self.assertEqual(results['post_delete']['statuses'], {'302': 3})
+        self.assertGreater(results['post_delete']['queries']['min'], 0)
+        self.assertLessEqual(results['index']['p50_ms'],
+                             results['index']['p99_ms'])
+
+    def test_percentile(self):
+        self.assertEqual(benchmark.percentile(range(1, 101), 95), 95)
+        self.assertEqual(benchmark.percentile([7], 99), 7)
+
+
+class DatabaseProfileSmokeTest(SimpleTestCase):
+    def test_feeds_on_file_database(self):
+        """Ленты проходят на файловой базе SQLite в режиме WAL"""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'report.json')
+            env = {**os.environ, 'YATUBE_DB': 'sqlite',
+                   'YATUBE_DB_TEST_NAME': os.path.join(directory,
+                                                       'bench.sqlite3')}
+            subprocess.run(
+                [sys.executable, 'manage.py', 'benchmark', '--only', 'feeds',
+                 '--iterations', '2', '--warmup', '0', '--output', output,
+                 *(f'--{name}={size}' for name, size in SIZES.items())],
+                cwd=settings.BASE_DIR, env=env, check=True,
+                capture_output=True)
+            with open(output) as file:
+                report = json.load(file)
+            self.assertEqual(os.listdir(directory), ['report.json'])
+        database = report['meta']['database']
+        self.assertEqual(database['profile'], 'sqlite')
+        self.assertEqual(database['journal_mode'], 'wal')
+        self.assertEqual(database['synchronous'], 1)
+        for name in benchmark.FEED_ROUTES:
+            with self.subTest(route=name):
+                self.assertEqual(report['results'][name]['statuses'],
+                                 {'200': 2})
@@ -0,0 +1,134 @@
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from .. import signals
+from ..models import AuthorCounters, Comment, Follow, Group, Post, User
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.reader = User.objects.create_user(username='TestReader')
+        cls.group = Group.objects.create(title='Тестовое имя группы',
+                                         slug='test_slug',
+                                         description='Тестовая группа')
+        cls.second_group = Group.objects.create(
+            title='Имя второй тестовой группы',
+            slug='second_test_slug',
+            description='Вторая тестовая группа'
+        )
+
+    def counters(self, user):
+        return AuthorCounters.objects.get(user=user)
+
+    def test_post_counters_follow_create_edit_delete(self):
+        """Счетчики постов автора и группы следуют за постами"""
+        post = Post.objects.create(text='Тестовый текст поста',
+                                   author=self.author, group=self.group)
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.group = self.second_group
+        post.save()
+        self.group.refresh_from_db()
+        self.second_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.second_group.posts_count, 1)
+        post.delete()
+        self.second_group.refresh_from_db()
+        self.assertEqual(self.counters(self.author).posts_count, 0)
+        self.assertEqual(self.second_group.posts_count, 0)
+
+    def test_comment_and_follow_counters(self):
+        """Счетчики комментариев и подписок следуют за записями"""
+        post = Post.objects.create(text='Тестовый текст поста',
+                                   author=self.author)
+        comment = Comment.objects.create(post=post, author=self.reader,
+                                         text='Тестовый комментарий')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.counters(self.author).followers_count, 0)
+        self.assertEqual(self.counters(self.reader).following_count, 0)
+
+    def delete_post_queries(self, comments):
+        post = Post.objects.create(text='Тестовый текст поста',
+                                   author=self.author)
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.reader, text=f'Комментарий {i}')
+            for i in range(comments))
+        with CaptureQueriesContext(connection) as queries:
+            post.delete()
+        self.assertFalse(Comment.objects.filter(post_id=post.pk).exists())
+        return len(queries)
+
+    def test_post_delete_queries_do_not_grow_with_comments(self):
+        """Комментарии удаляемого поста удаляются одним запросом"""
+        self.assertEqual(self.delete_post_queries(2),
+                         self.delete_post_queries(30))
+
+    def test_user_delete_updates_comment_counters(self):
+        """Удаление пользователя пересчитывает комментарии чужих постов"""
+        post = Post.objects.create(text='Тестовый текст поста',
+                                   author=self.author)
+        Comment.objects.create(post=post, author=self.reader,
+                               text='Тестовый комментарий')
+        Comment.objects.create(post=post, author=self.author,
+                               text='Ответ автора')
+        self.reader.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        Comment.objects.create(post=post, author=self.author,
+                               text='Еще ответ')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+
+    def test_comment_queryset_delete_updates_counters(self):
+        """Массовое удаление комментариев пересчитывает счетчики"""
+        post = Post.objects.create(text='Тестовый текст поста',
+                                   author=self.author)
+        for i in range(3):
+            Comment.objects.create(post=post, author=self.reader,
+                                   text=f'Комментарий {i}')
+        Comment.objects.filter(pk__in=list(
+            post.comments.values_list('pk', flat=True)[:2])).delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_failed_delete_leaves_signals_working(self):
+        """Сорвавшееся удаление не отключает обработку следующих"""
+        post = Post.objects.create(text='Тестовый текст поста',
+                                   author=self.author)
+        comment = Comment.objects.create(post=post, author=self.reader,
+                                         text='Тестовый комментарий')
+        with self.assertRaises(RuntimeError):
+            with signals.muted():
+                raise RuntimeError
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_rebuild_counters_command(self):
+        """Команда rebuild_counters пересчитывает счетчики с нуля"""
+        Post.objects.bulk_create(
+            Post(text=f'Тестовый текст поста {i}', author=self.author,
+                 group=self.group)
+            for i in range(3)
+        )
+        Follow.objects.bulk_create([Follow(user=self.reader,
+                                           author=self.author)])
+        call_command('rebuild_counters', stdout=StringIO())
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 3)
+        self.assertEqual(self.counters(self.author).posts_count, 3)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
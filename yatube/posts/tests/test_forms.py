@@ -1,15 +1,19 @@
 import shutil
 import tempfile
+from io import BytesIO
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
+from ..forms import PostForm
 from ..models import Group, Post, User, Comment
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   POST_IMAGE_RENDITION_WORKERS=0)
 class PostCreateFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -129,3 +133,57 @@ class PostCreateFormTests(TestCase):
                 author=self.author
             ).exists()
         )
+
+
+def png_upload(size, name='picture.png'):
+    buffer = BytesIO()
+    Image.new('RGB', size, color=(0, 128, 255)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   POST_IMAGE_RENDITION_WORKERS=0)
+class PostImageUploadTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def form(self, upload):
+        return PostForm(data={'text': 'Пост с картинкой'},
+                        files={'image': upload})
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=100)
+    def test_large_file_is_rejected(self):
+        """Файл больше предела не принимается"""
+        form = self.form(png_upload((200, 200)))
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()['image'][0].code,
+                         'file_too_large')
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_large_image_is_rejected(self):
+        """Картинка с лишними пикселями не принимается"""
+        form = self.form(png_upload((20, 20)))
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()['image'][0].code,
+                         'image_too_large')
+
+    @override_settings(POST_IMAGE_MAX_SIDE=32)
+    def test_original_is_downscaled(self):
+        """Оригинал больше предела уменьшается с сохранением пропорций"""
+        form = self.form(png_upload((128, 64)))
+        self.assertTrue(form.is_valid())
+        post = form.save(commit=False)
+        post.author = User.objects.create_user(username='Photographer')
+        post.save()
+        self.assertEqual((post.image.width, post.image.height), (32, 16))
+
+    @override_settings(POST_IMAGE_MAX_SIDE=32)
+    def test_small_original_is_kept(self):
+        """Картинка меньше предела сохраняется как есть"""
+        upload = png_upload((16, 8))
+        form = self.form(upload)
+        self.assertTrue(form.is_valid())
+        self.assertIs(form.cleaned_data['image'], upload)
@@ -0,0 +1,145 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import feed_cache, moderation, search
+from ..counters import rebuild_all
+from ..models import (AuthorCounters, Comment, Follow, Group, Post,
+                      TimelineEntry, User)
+
+
+@override_settings(MODERATION_BATCH_SIZE=2)
+class ModerationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.spammer = User.objects.create_user(username='spammer')
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.old_group = Group.objects.create(title='Старая', slug='old',
+                                             description='-')
+        cls.new_group = Group.objects.create(title='Новая', slug='new',
+                                             description='-')
+        Follow.objects.create(user=cls.reader, author=cls.spammer)
+        cls.spam = [Post.objects.create(author=cls.spammer,
+                                        group=cls.old_group,
+                                        text=f'Реклама {i}')
+                    for i in range(5)]
+        cls.post = Post.objects.create(author=cls.author,
+                                       group=cls.old_group, text='Пост')
+        cls.comments = [Comment.objects.create(post=cls.post,
+                                               author=cls.reader,
+                                               text=f'Отзыв {i}')
+                        for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_counters_match(self):
+        """Счетчики после модерации совпадают с полным пересчетом"""
+        values = (
+            list(AuthorCounters.objects.order_by('user')
+                 .values_list('user', 'posts_count')),
+            list(Group.objects.order_by('pk')
+                 .values_list('pk', 'posts_count')),
+            list(Post.objects.order_by('pk')
+                 .values_list('pk', 'comments_count')),
+        )
+        rebuild_all()
+        self.assertEqual(values, (
+            list(AuthorCounters.objects.order_by('user')
+                 .values_list('user', 'posts_count')),
+            list(Group.objects.order_by('pk')
+                 .values_list('pk', 'posts_count')),
+            list(Post.objects.order_by('pk')
+                 .values_list('pk', 'comments_count')),
+        ))
+
+    def test_regroup_in_batches(self):
+        """Посты переносятся пачками, счетчики и кэш обновляются"""
+        generation, = feed_cache.generations(
+            feed_cache.group_scope(self.new_group.pk))
+        progress = []
+        done = moderation.regroup_posts(
+            Post.objects.filter(author=self.spammer), self.new_group,
+            progress.append)
+        self.assertEqual(done, 5)
+        self.assertEqual(progress, [2, 4, 5])
+        self.assertEqual(self.new_group.posts.count(), 5)
+        self.new_group.refresh_from_db()
+        self.assertEqual(self.new_group.posts_count, 5)
+        self.assertNotEqual(feed_cache.generations(
+            feed_cache.group_scope(self.new_group.pk)), [generation])
+        self.assertEqual(len(search.search('Новая реклама', 10)[0]), 5)
+        self.assert_counters_match()
+
+    @override_settings(MODERATION_BATCH_SIZE=100)
+    def test_regroup_queries_do_not_grow_with_batch(self):
+        """Пачка переиндексируется двумя запросами, а не по посту"""
+        counts = []
+        for author in (self.author, self.spammer):
+            with CaptureQueriesContext(connection) as queries:
+                moderation.regroup_posts(Post.objects.filter(author=author),
+                                         self.new_group)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_delete_by_author(self):
+        """Посты автора удаляются вместе с лентами и индексом"""
+        done = moderation.delete_posts_by_authors([self.spammer.pk])
+        self.assertEqual(done, 5)
+        self.assertFalse(Post.objects.filter(author=self.spammer).exists())
+        self.assertFalse(TimelineEntry.objects.filter(
+            author=self.spammer).exists())
+        self.assertEqual(search.search('Реклама', 10)[0], [])
+        self.assertTrue(Post.objects.filter(pk=self.post.pk).exists())
+        self.assert_counters_match()
+
+    def test_purge_comments_by_dates(self):
+        """Удаляются только комментарии за период"""
+        Comment.objects.filter(pk=self.comments[0].pk).update(
+            created=timezone.now() - timedelta(days=10))
+        today = timezone.localdate()
+        done = moderation.purge_comments(
+            Comment.objects.all(), since=today, until=today)
+        self.assertEqual(done, 2)
+        self.assertEqual(list(Comment.objects.all()), [self.comments[0]])
+        self.assertEqual(search.search('Отзыв', 10)[0], [self.post])
+        self.assert_counters_match()
+
+    def test_admin_actions(self):
+        """Действия админки запускают массовую модерацию"""
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.client.force_login(admin)
+        response = self.client.post(
+            reverse('admin:posts_post_changelist'),
+            {'action': 'move_to_group', 'group': self.new_group.pk,
+             '_selected_action': [self.post.pk]}, follow=True)
+        self.assertContains(response, 'Перенесено постов: 1')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.group, self.new_group)
+        self.client.post(
+            reverse('admin:posts_post_changelist'),
+            {'action': 'delete_author_posts',
+             '_selected_action': [self.spam[0].pk]})
+        self.assertFalse(Post.objects.filter(author=self.spammer).exists())
+        self.client.post(
+            reverse('admin:posts_comment_changelist'),
+            {'action': 'purge_comments', 'since': '',
+             'until': timezone.localdate().isoformat(),
+             '_selected_action': [self.comments[1].pk]})
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_command(self):
+        """Команда moderate выводит ход работы"""
+        out = StringIO()
+        call_command('moderate', 'regroup', 'old', '-', stdout=out)
+        self.assertIn('Обработано: 2', out.getvalue())
+        self.assertIn('Готово: 6', out.getvalue())
+        self.assertFalse(Post.objects.filter(group__isnull=False).exists())
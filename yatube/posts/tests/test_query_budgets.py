@@ -0,0 +1,109 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.query_budget import QueryBudgetMixin, route_names
+from users import urls as users_urls
+
+from .. import benchmark, urls as posts_urls
+from ..models import Post
+
+# Бюджеты запросов по маршрутам: (аноним, вошедший пользователь).
+# У вошедшего два запроса уходят на сессию и пользователя; None —
+# страница только для вошедших или только для анонимов. Число запросов
+# не должно зависеть от количества постов и комментариев на странице
+BUDGETS = {
+    'posts:index': (1, 3),
+    'posts:group_list': (2, 4),
+    'posts:profile': (2, 5),
+    'posts:post_detail': (2, 4),
+    'posts:post_comments': (2, 4),
+    'posts:search': (2, 4),
+    'posts:post_create': (None, 3),
+    'posts:post_edit': (None, 5),
+    'posts:add_comment': (None, 7),
+    'posts:follow_index': (None, 3),
+    'posts:profile_follow': (None, 4),
+    'posts:profile_unfollow': (None, 8),
+    'posts:post_delete': (None, 10),
+    'users:logout': (None, 4),
+    'users:signup': (0, None),
+    'users:login': (0, None),
+    'users:password_reset': (None, 2),
+}
+
+# Маршруты, которые после действия перенаправляют; остальные отдают 200
+REDIRECTS = {'posts:add_comment', 'posts:profile_follow',
+             'posts:profile_unfollow', 'posts:post_delete'}
+
+SIZES = {'users': 12, 'groups': 3, 'posts': 120, 'comments': 400,
+         'follows': 40}
+
+
+def users_scenarios():
+    return {
+        'logout': ('get', reverse('users:logout'), None, True, None),
+        'signup': ('get', reverse('users:signup'), None, False, None),
+        'login': ('get', reverse('users:login'), None, False, None),
+        'password_reset': ('get', reverse('users:password_reset'), None,
+                           True, None),
+    }
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        benchmark.seed(SIZES, seed_value=7)
+
+    def setUp(self):
+        cache.clear()
+        self.fixtures = benchmark.Fixtures()
+        self.scenarios = {
+            **{f'posts:{name}': scenario for name, scenario in
+               benchmark.scenarios(self.fixtures).items()},
+            **{f'users:{name}': scenario for name, scenario in
+               users_scenarios().items()},
+        }
+
+    def test_every_route_has_budget(self):
+        """У каждого маршрута posts и users есть сценарий и бюджет"""
+        routes = route_names(posts_urls, users_urls)
+        self.assertEqual(
+            [route for route in routes if route not in BUDGETS], [])
+        self.assertEqual(
+            [route for route in routes if route not in self.scenarios], [])
+
+    def test_routes_stay_within_budget(self):
+        """Каждая страница укладывается в свой бюджет запросов"""
+        for name, (method, url, data, login, prepare) in \
+                self.scenarios.items():
+            route = name.split(' ')[0]
+            budget = BUDGETS[route][int(login)]
+            client = Client()
+            if login:
+                client.force_login(self.fixtures.author)
+            target = prepare() if prepare is not None else url
+            with self.subTest(scenario=name):
+                self.assertIsNotNone(budget)
+                cache.clear()
+                with self.assertQueryBudget(budget, name):
+                    response = getattr(client, method)(target, data)
+                # Бюджет что-то значит, только если страница отработала
+                # целиком, а не вернула ошибку или редирект на вход
+                if route in REDIRECTS:
+                    self.assertEqual(response.status_code, 302)
+                    self.assertFalse(response.url.startswith(
+                        reverse('users:login')))
+                else:
+                    self.assertEqual(response.status_code, 200)
+
+    def test_report_groups_duplicates(self):
+        """Сообщение о превышении группирует повторы по шаблону"""
+        with self.assertRaises(AssertionError) as raised:
+            with self.assertQueryBudget(1, 'N+1'):
+                for post in Post.objects.all()[:3]:
+                    post.author.username
+        message = str(raised.exception)
+        self.assertIn('N+1: 4 запросов при бюджете 1', message)
+        self.assertIn('3 × повтор', message)
+        self.assertIn('WHERE "auth_user"."id" = ?', message)
@@ -0,0 +1,112 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import search
+from ..models import Comment, Group, Post, User
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='writer',
+                                              first_name='Лев')
+        cls.group = Group.objects.create(title='Ёжики', slug='hedgehogs',
+                                         description='Группа')
+        cls.in_text = Post.objects.create(
+            author=cls.author, text='Собака лает, караван идет')
+        cls.in_comment = Post.objects.create(
+            author=cls.author, text='Пост без ключевого слова')
+        Comment.objects.create(post=cls.in_comment, author=cls.author,
+                               text='А где же собака?')
+        cls.in_group = Post.objects.create(
+            author=cls.author, text='Про колючих', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def found(self, query, per_page=10, after=None):
+        posts, next_cursor = search.search(query, per_page, after)
+        return [post.pk for post in posts], next_cursor
+
+    def test_index_is_available(self):
+        """Таблицы FTS5 созданы миграцией"""
+        self.assertTrue(search.available())
+
+    def test_post_text_ranks_above_comment(self):
+        """Совпадение в посте выше совпадения в комментарии"""
+        found, _ = self.found('собака')
+        self.assertEqual(found, [self.in_text.pk, self.in_comment.pk])
+
+    def test_group_and_author_match(self):
+        """Находятся посты по группе, логину и имени автора, ё = е"""
+        self.assertEqual(self.found('ежики')[0], [self.in_group.pk])
+        self.assertEqual(len(self.found('writer')[0]), 3)
+        self.assertEqual(len(self.found('Лев')[0]), 3)
+
+    def test_prefix_and_all_words(self):
+        """Слова ищутся по префиксу и должны встретиться все"""
+        self.assertEqual(self.found('карав ид')[0], [self.in_text.pk])
+        self.assertEqual(self.found('караван кошка')[0], [])
+
+    def test_special_characters_are_ignored(self):
+        """Синтаксис FTS5 в запросе не ломает поиск"""
+        self.assertEqual(self.found('"собака* -(лает:')[0],
+                         [self.in_text.pk])
+        self.assertEqual(self.found('*:()')[0], [])
+
+    def test_cursor_pages(self):
+        """Курсор продолжает выдачу без повторов"""
+        first, cursor = self.found('writer', per_page=2)
+        second, last_cursor = self.found('writer', per_page=2, after=cursor)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertIsNone(last_cursor)
+        self.assertFalse(set(first) & set(second))
+
+    def test_index_follows_changes(self):
+        """Правки и удаления сразу видны в поиске"""
+        self.in_text.text = 'Кошка мурлычет'
+        self.in_text.save()
+        self.assertEqual(self.found('собака')[0], [self.in_comment.pk])
+        self.in_comment.comments.all().delete()
+        self.assertEqual(self.found('собака')[0], [])
+        self.group.title = 'Колючки'
+        self.group.save()
+        self.assertEqual(self.found('колючки')[0], [self.in_group.pk])
+        self.author.username = 'novelist'
+        self.author.save()
+        self.assertEqual(len(self.found('novelist')[0]), 3)
+        self.in_group.delete()
+        self.assertEqual(self.found('колючки')[0], [])
+
+    def test_unchanged_names_are_not_reindexed(self):
+        """Сохранение без смены имени и названия не трогает индекс"""
+        author = User.objects.get(pk=self.author.pk)
+        group = Group.objects.get(pk=self.group.pk)
+        author.set_password('новый пароль')
+        group.description = 'Новое описание'
+        with CaptureQueriesContext(connection) as queries:
+            author.save()
+            group.save()
+        self.assertFalse([query for query in queries
+                          if '_search' in query['sql']])
+
+    def test_rebuild(self):
+        """Команда строит индекс заново"""
+        search.rebuild()
+        self.assertEqual(self.found('собака')[0],
+                         [self.in_text.pk, self.in_comment.pk])
+
+    def test_search_page(self):
+        """Страница поиска выводит найденные посты"""
+        response = self.client.get(reverse('posts:search'),
+                                   {'q': 'собака'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['posts'],
+                         [self.in_text, self.in_comment])
+        self.assertIsNone(response.context['next_cursor'])
+        response = self.client.get(reverse('posts:search'))
+        self.assertEqual(response.context['posts'], [])
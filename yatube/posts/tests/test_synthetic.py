@@ -0,0 +1,123 @@
+import random
+import shutil
+import tempfile
+from collections import Counter
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .. import search, synthetic
+from ..counters import rebuild_all
+from ..models import (AuthorCounters, Comment, Follow, Group, Post,
+                      TimelineEntry, User)
+
+SIZES = {'users': 30, 'groups': 3, 'posts': 200, 'comments': 300,
+         'follows': 60}
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SyntheticDataTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        synthetic.generate(SIZES, seed=3, images=0.5, batch_size=50)
+
+    def dataset(self):
+        return (
+            list(User.objects.order_by('pk').values_list(
+                'username', 'first_name', 'last_name')),
+            list(Post.objects.order_by('pk').values_list(
+                'text', 'author__username', 'group__slug', 'image',
+                'pub_date')),
+            list(Comment.objects.order_by('pk').values_list(
+                'post__text', 'author__username', 'created')),
+            list(Follow.objects.order_by('pk').values_list(
+                'user__username', 'author__username')),
+        )
+
+    def test_sizes(self):
+        """Создается ровно столько объектов, сколько задано"""
+        self.assertEqual(User.objects.count(), SIZES['users'])
+        self.assertEqual(Group.objects.count(), SIZES['groups'])
+        self.assertEqual(Post.objects.count(), SIZES['posts'])
+        self.assertEqual(Comment.objects.count(), SIZES['comments'])
+        self.assertLessEqual(Follow.objects.count(), SIZES['follows'])
+        self.assertFalse(Follow.objects.filter(
+            user=F('author')).exists())
+
+    def test_seed_is_deterministic(self):
+        """Тот же seed дает те же данные"""
+        first = self.dataset()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        synthetic.generate(SIZES, seed=3, images=0.5, batch_size=50)
+        second = self.dataset()
+        # Даты отсчитываются от момента запуска
+        self.assertEqual([row[:4] for row in first[1]],
+                         [row[:4] for row in second[1]])
+        self.assertEqual(first[0], second[0])
+        self.assertEqual(first[3], second[3])
+
+    def test_authors_are_skewed(self):
+        """Немногие авторы пишут большую часть постов"""
+        posts = Counter(Post.objects.values_list('author_id', flat=True))
+        top = sum(count for _, count in posts.most_common(3))
+        uniform = SIZES['posts'] * 3 / SIZES['users']
+        self.assertGreater(top, 2 * uniform)
+        followers = Counter(Follow.objects.values_list('author_id',
+                                                       flat=True))
+        self.assertGreater(followers.most_common(1)[0][1], 2)
+
+    def test_dates_and_images(self):
+        """Комментарии не раньше постов, у части постов есть картинки"""
+        self.assertFalse(Comment.objects.filter(
+            created__lt=F('post__pub_date')).exists())
+        with_images = Post.objects.exclude(image='')
+        self.assertTrue(with_images.exists())
+        self.assertTrue(with_images.first().image.storage.exists(
+            with_images.first().image.name))
+
+    def test_derived_data_is_built(self):
+        """Счетчики, ленты и поисковый индекс готовы"""
+        values = list(AuthorCounters.objects.order_by('user')
+                      .values_list('posts_count', 'followers_count'))
+        rebuild_all()
+        self.assertEqual(values, list(
+            AuthorCounters.objects.order_by('user')
+            .values_list('posts_count', 'followers_count')))
+        follow = Follow.objects.first()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user_id=follow.user_id, author_id=follow.author_id).exists())
+        post = Post.objects.first()
+        word = post.text.split()[0].strip('.,')
+        self.assertIn(post, search.search(word, SIZES['posts'])[0])
+
+    def test_zipf_sampler(self):
+        """Первый ранг выпадает чаще десятого"""
+        sample = synthetic.ZipfSampler(100, 1.1, random.Random(0))
+        ranks = Counter(sample() for _ in range(5000))
+        self.assertTrue(all(1 <= rank <= 100 for rank in ranks))
+        self.assertGreater(ranks[1], ranks[10] * 3)
+
+
+class GenerateDataCommandTest(SimpleTestCase):
+    def test_dependent_sizes_are_checked(self):
+        """Посты и комментарии без авторов или постов не создаются"""
+        cases = [
+            {'users': 0, 'posts': 10, 'comments': 0},
+            {'users': 0, 'posts': 0, 'comments': 10},
+            {'users': 5, 'posts': 0, 'comments': 10},
+        ]
+        for sizes in cases:
+            with self.subTest(**sizes):
+                with self.assertRaises(CommandError):
+                    call_command('generate_data', groups=0, follows=0,
+                                 **sizes)
@@ -0,0 +1,199 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail import get_thumbnail
+
+from .. import thumbnails
+from ..models import Post, User
+from ..images import extra_formats
+from ..thumbnails import build, prefetch, thumbnail_file
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   POST_IMAGE_RENDITION_WORKERS=0)
+class RenditionsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Painter')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.author,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF,
+                                     content_type='image/gif'),
+        )
+
+    def test_build_stores_all_renditions(self):
+        """Все варианты из настроек строятся и попадают в пост"""
+        self.assertTrue(build(self.post.pk))
+        renditions = Post.objects.get(pk=self.post.pk).renditions
+        self.assertEqual(set(renditions),
+                         set(settings.POST_IMAGE_RENDITIONS))
+        self.assertEqual(renditions['list']['width'], 960)
+        self.assertEqual(renditions['list']['height'], 339)
+        self.assertTrue(
+            renditions['list']['url'].startswith(settings.MEDIA_URL))
+
+    @skipUnless(extra_formats(), 'Pillow собран без WebP и AVIF')
+    def test_extra_formats_are_built(self):
+        """Варианты строятся и в дополнительных форматах"""
+        build(self.post.pk)
+        renditions = Post.objects.get(pk=self.post.pk).renditions
+        source = renditions['list']['sources'][0]
+        self.assertNotEqual(source['url'], renditions['list']['url'])
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, f'type="{source["type"]}"')
+
+    def test_feeds_use_stored_renditions(self):
+        """Ленты и страница поста выводят готовые варианты"""
+        build(self.post.pk)
+        renditions = Post.objects.get(pk=self.post.pk).renditions
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, renditions['list']['url'])
+        self.assertContains(response,
+                            f'srcset="{renditions["retina"]["url"]} 2x"')
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        self.assertContains(response, renditions['detail']['url'])
+
+    def test_cached_pages_pick_up_renditions(self):
+        """Закэшированные до построения вариантов страницы обновляются"""
+        cache.clear()
+        urls = [reverse('posts:index'),
+                reverse('posts:profile', args=[self.author.username]),
+                reverse('posts:post_detail', args=[self.post.pk])]
+        for url in urls:
+            self.client.get(url)
+        build(self.post.pk)
+        renditions = Post.objects.get(pk=self.post.pk).renditions
+        for url, rendition in zip(urls, ('list', 'list', 'detail')):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url),
+                                    renditions[rendition]['url'])
+
+    def test_renditions_of_replaced_image_are_ignored(self):
+        """Варианты прежней картинки не выводятся"""
+        build(self.post.pk)
+        Post.objects.filter(pk=self.post.pk).update(image='posts/other.gif')
+        self.assertEqual(Post.objects.get(pk=self.post.pk).renditions, {})
+
+    def test_missing_image_is_not_built(self):
+        """Отсутствующий файл картинки не ломает построение"""
+        Post.objects.filter(pk=self.post.pk).update(image='posts/none.gif')
+        with self.assertLogs('posts.thumbnails', 'ERROR'):
+            self.assertFalse(build(self.post.pk))
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).image_renditions, '')
+
+    def test_submit_defers_to_pool(self):
+        """С пулом потоков варианты строятся вне запроса"""
+        with override_settings(POST_IMAGE_RENDITION_WORKERS=2), \
+                mock.patch.object(thumbnails, '_get_executor') as executor:
+            thumbnails._submit(self.post.pk)
+        executor.return_value.submit.assert_called_once_with(
+            thumbnails._build_in_worker, self.post.pk)
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).image_renditions, '')
+
+    def test_submit_outside_request_builds_inline(self):
+        """Вне запроса без пула варианты строятся сразу"""
+        thumbnails._submit(self.post.pk)
+        self.assertTrue(Post.objects.get(pk=self.post.pk).renditions)
+
+    def test_submit_in_request_builds_after_response(self):
+        """В запросе без пула варианты строятся после ответа"""
+        thumbnails._start_request(sender=None)
+        try:
+            thumbnails._submit(self.post.pk)
+            self.assertEqual(
+                Post.objects.get(pk=self.post.pk).image_renditions, '')
+        finally:
+            thumbnails._build_after_response(sender=None)
+        self.assertTrue(Post.objects.get(pk=self.post.pk).renditions)
+
+    def test_build_renditions_command(self):
+        """Команда достраивает варианты постов, у которых их нет"""
+        call_command('build_renditions', stdout=StringIO())
+        self.assertTrue(Post.objects.get(pk=self.post.pk).renditions)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPrefetchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='Sketcher')
+        for number in range(3):
+            Post.objects.create(
+                text=f'Набросок {number}',
+                author=author,
+                image=SimpleUploadedFile(f'sketch{number}.gif', SMALL_GIF,
+                                         content_type='image/gif'),
+            )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # Записи хранилища ключей откатываются после теста, а кэш нет
+        cache.clear()
+        geometry, options = settings.POST_IMAGE_RENDITIONS['list']
+        self.thumbnails = {
+            post.pk: get_thumbnail(post.image, geometry, **options)
+            for post in Post.objects.all()
+        }
+        cache.clear()
+
+    def test_thumbnail_file_matches_get_thumbnail(self):
+        """Имя миниатюры совпадает с тем, что строит sorl"""
+        geometry, options = settings.POST_IMAGE_RENDITIONS['list']
+        for post in Post.objects.all():
+            self.assertEqual(
+                thumbnail_file(post.image, geometry, **options).name,
+                self.thumbnails[post.pk].name)
+
+    def test_prefetch_reads_page_in_one_lookup(self):
+        """Миниатюры страницы читаются одним запросом, затем из кэша"""
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(1):
+            prefetch(posts)
+        for post in posts:
+            self.assertEqual(post.thumbnail.name,
+                             self.thumbnails[post.pk].name)
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(0):
+            prefetch(posts)
+
+    def test_feed_renders_prefetched_thumbnails(self):
+        """Лента выводит найденные миниатюры"""
+        response = self.client.get(reverse('posts:index'))
+        for thumbnail in self.thumbnails.values():
+            self.assertContains(response, thumbnail.url)
@@ -0,0 +1,79 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from ..models import Post, User
+from ..page_counts import CachedCount, CappedCount, CounterCount
+from ..utils import WindowPaginator
+
+
+class WindowPaginatorTest(SimpleTestCase):
+    def setUp(self):
+        self.paginator = WindowPaginator(range(50000 * 10), 10)
+        self.ellipsis = WindowPaginator.ELLIPSIS
+
+    def test_window_size_does_not_depend_on_pages(self):
+        """Окно номеров не растет с числом страниц"""
+        self.assertEqual(
+            list(self.paginator.get_elided_page_range(25000)),
+            [1, 2, self.ellipsis, 24997, 24998, 24999, 25000, 25001,
+             25002, 25003, self.ellipsis, 49999, 50000])
+
+    def test_window_at_the_edges(self):
+        """У первой и последней страниц многоточие только с одной стороны"""
+        self.assertEqual(list(self.paginator.get_elided_page_range(1)),
+                         [1, 2, 3, 4, self.ellipsis, 49999, 50000])
+        self.assertEqual(list(self.paginator.get_elided_page_range(50000)),
+                         [1, 2, self.ellipsis, 49997, 49998, 49999, 50000])
+
+    def test_few_pages_are_shown_whole(self):
+        """Если страниц мало, выводятся все"""
+        paginator = WindowPaginator(range(30), 10)
+        self.assertEqual(list(paginator.get_elided_page_range(2)), [1, 2, 3])
+
+    def test_counter_replaces_count(self):
+        """Число записей берется у counter"""
+        paginator = WindowPaginator(range(30), 10,
+                                    CounterCount(lambda: 1000))
+        self.assertEqual(paginator.num_pages, 100)
+
+
+class PageCountsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='TestAuthor')
+        Post.objects.bulk_create(Post(text=f'Пост {i}', author=author)
+                                 for i in range(25))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_count_queries_once(self):
+        """Закэшированное число не пересчитывается при следующем просмотре"""
+        with self.assertNumQueries(1):
+            self.assertEqual(CachedCount('test').count(Post.objects.all()),
+                             (25, False))
+        with self.assertNumQueries(0):
+            CachedCount('test').count(Post.objects.all())
+
+    def test_capped_count(self):
+        """Выше предела считается только cap + 1 записей"""
+        self.assertEqual(CappedCount(10).count(Post.objects.all()),
+                         (11, False))
+        self.assertEqual(CappedCount(100).count(Post.objects.all()),
+                         (25, True))
+
+    def test_inexact_count_is_recounted_at_the_end(self):
+        """У конца известных страниц число пересчитывается точно,
+            а раньше окно номеров обрывается многоточием"""
+        paginator = WindowPaginator(Post.objects.order_by('pk'), 2,
+                                    CappedCount(10))
+        page = paginator.get_page(1)
+        self.assertFalse(paginator.count_is_exact)
+        self.assertEqual(list(paginator.get_elided_page_range(page.number)),
+                         [1, 2, 3, 4, WindowPaginator.ELLIPSIS])
+        paginator = WindowPaginator(Post.objects.order_by('pk'), 2,
+                                    CappedCount(10))
+        page = paginator.get_page(6)
+        self.assertTrue(paginator.count_is_exact)
+        self.assertEqual(paginator.num_pages, 13)
+        self.assertTrue(page.has_next())
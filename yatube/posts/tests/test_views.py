@@ -4,7 +4,7 @@ from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase, Client, override_settings
 from django.core.cache import cache
-from ..models import Group, Post, User, Follow
+from ..models import Comment, Group, Post, User, Follow
 from django.urls import reverse
 from django import forms
 import time
@@ -172,20 +172,38 @@ class PostPagesTests(TestCase):
         comparison(response_create)
 
     def test_cache_index_page_show_correct_context(self):
-        """В шаблоне index кешируется контент"""
+        """В шаблоне index кешируется контент до изменения постов"""
+        cache.clear()
         response = self.first_author_client.get(reverse('posts:index'))
         initial_content = response.content
+        # update() не отправляет сигналов, поэтому кэш не сбрасывается
+        Post.objects.filter(pk=self.post.pk).update(
+            text='Текст, измененный в обход сигналов')
+        response = self.first_author_client.get(reverse('posts:index'))
+        cached_content = response.content
+        self.assertEqual(initial_content, cached_content)
         Post.objects.create(
             text='Пост для проверки кэширования',
             author=self.author,
         )
         response = self.first_author_client.get(reverse('posts:index'))
-        cached_content = response.content
-        self.assertEqual(initial_content, cached_content)
-        cache.clear()
-        response = self.first_author_client.get(reverse('posts:index'))
         new_content = response.content
         self.assertNotEqual(initial_content, new_content)
+        self.assertIn('Пост для проверки кэширования', new_content.decode())
+
+    def test_cache_feed_keys_include_page(self):
+        """Разные страницы ленты кешируются под разными ключами"""
+        cache.clear()
+        for number in range(POSTS_NUMBER):
+            Post.objects.create(text=f'Пост для второй страницы {number}',
+                                author=self.author)
+        first_page = self.first_author_client.get(reverse('posts:index'))
+        second_page = self.first_author_client.get(
+            reverse('posts:index'),
+            {'after': first_page.context['page_obj'].next_cursor}
+        )
+        self.assertIn('Текст второго поста', second_page.content.decode())
+        self.assertNotIn('Текст второго поста', first_page.content.decode())
 
 
 class PaginatorViewsTest(TestCase):
@@ -215,6 +233,7 @@ class PaginatorViewsTest(TestCase):
         Post.objects.bulk_create(posts_list)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
 
     def test_first_pages_contains_ten_records(self):
@@ -233,6 +252,179 @@ class PaginatorViewsTest(TestCase):
                 response = self.guest_client.get(reverse_name + '?page=2')
                 self.assertEqual(len(response.context['page_obj']), 3)
 
+    def test_cursor_pages_follow_each_other(self):
+        """Курсоры ?after= и ?before= листают index, group_list, profile
+            вперед и назад без пропусков и повторов"""
+        for reverse_name in self.templates_pages_names:
+            with self.subTest(reverse_name=reverse_name):
+                first_page = self.guest_client.get(
+                    reverse_name).context['page_obj']
+                self.assertIsNone(first_page.previous_cursor)
+                second_page = self.guest_client.get(
+                    reverse_name, {'after': first_page.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(len(second_page), 3)
+                self.assertIsNone(second_page.next_cursor)
+                back_page = self.guest_client.get(
+                    reverse_name, {'before': second_page.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(back_page), list(first_page))
+                self.assertIsNone(back_page.previous_cursor)
+
+    def test_broken_cursor_shows_first_page(self):
+        """Испорченный курсор открывает первую страницу"""
+        response = self.guest_client.get(reverse('posts:index'),
+                                         {'after': 'broken'})
+        self.assertEqual(len(response.context['page_obj']), POSTS_NUMBER)
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='TestCommentator')
+        cls.post = Post.objects.create(text='Обсуждаемый пост',
+                                       author=author)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=author,
+                    text=f'Комментарий {i}')
+            for i in range(settings.COMMENTS_NUMBER + 5)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_shows_first_comments(self):
+        """Страница поста выводит первую пачку комментариев
+            и ссылку на следующую"""
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), settings.COMMENTS_NUMBER)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        self.assertContains(response, comments.next_cursor)
+
+    def test_next_comments_fragment(self):
+        """Фрагмент отдает оставшиеся комментарии без повторов
+            одним запросом на пост и одним на комментарии"""
+        first_page = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        ).context['comments']
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse('posts:post_comments', args=[self.post.pk]),
+                {'after': first_page.next_cursor})
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        texts = [comment.text for comment in response.context['comments']]
+        self.assertEqual(
+            texts, [f'Комментарий {i}' for i in range(
+                settings.COMMENTS_NUMBER, settings.COMMENTS_NUMBER + 5)])
+        self.assertIsNone(response.context['comments'].next_cursor)
+
+    def test_next_comments_json(self):
+        """С ?format=json фрагмент отдается в JSON"""
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk]),
+            {'format': 'json'})
+        data = response.json()
+        self.assertEqual(len(data['comments']), settings.COMMENTS_NUMBER)
+        self.assertEqual(data['comments'][0]['author'], 'TestCommentator')
+        self.assertIsNotNone(data['next_cursor'])
+
+
+class ConditionalPagesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.group = Group.objects.create(title='Тестовое имя группы',
+                                         slug='test_slug',
+                                         description='Тестовая группа')
+        cls.post = Post.objects.create(text='Тестовый текст поста',
+                                       author=cls.author, group=cls.group)
+        cls.urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse('posts:profile', kwargs={'username': 'TestAuthor'}),
+            reverse('posts:post_detail', args=[cls.post.pk]),
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_revalidation_returns_304(self):
+        """Повторный запрос с If-None-Match получает 304"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_new_post_changes_etag(self):
+        """Новый пост меняет ETag лент, где он виден"""
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls[:3]}
+        Post.objects.create(text='Новый пост', author=self.author,
+                            group=self.group)
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'Новый пост')
+
+    def test_author_rename_refreshes_pages(self):
+        """Новое имя автора сразу видно на всех страницах"""
+        for url in self.urls:
+            self.client.get(url)
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name, author.last_name = 'Лев', 'Толстой'
+        author.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Лев Толстой')
+
+    def test_group_change_refreshes_pages(self):
+        """Новые название и slug группы и ее удаление сразу видны в ленте
+        и на странице поста"""
+        index, detail = self.urls[0], self.urls[3]
+        self.client.get(index)
+        self.client.get(detail)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title, group.slug = 'Переименованная группа', 'renamed'
+        group.save()
+        link = reverse('posts:group_list', kwargs={'slug': 'renamed'})
+        self.assertContains(self.client.get(index), link)
+        self.assertContains(self.client.get(detail),
+                            'Переименованная группа')
+        group.delete()
+        self.assertNotContains(self.client.get(index), link)
+        self.assertNotContains(self.client.get(detail),
+                               'Переименованная группа')
+
+    def test_comment_changes_post_etag(self):
+        """Новый комментарий меняет ETag страницы поста"""
+        url = self.urls[3]
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(post=self.post, author=self.author,
+                               text='Новый комментарий')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_anonymous_pages_are_cached_whole(self):
+        """Повторный анонимный запрос отдается из кэша без запросов
+            к базе, а авторизованный рендерится заново"""
+        url = self.urls[0]
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'Тестовый текст поста')
+        self.author_client.get(url)
+        response = self.author_client.get(url)
+        self.assertIsNotNone(response.context)
+        self.assertNotEqual(response['ETag'], self.client.get(url)['ETag'])
+
 
 class FollowPagesTests(TestCase):
     @classmethod
@@ -286,6 +478,19 @@ class FollowPagesTests(TestCase):
         self.assertRedirects(response, reverse('posts:profile',
                              args=['TestAuthor']))
 
+    def test_follower_profile_shows_following_count(self):
+        """Профиль подписчика сразу показывает новое число подписок"""
+        cache.clear()
+        url = reverse('posts:profile', kwargs={'username': 'TestUserOne'})
+        self.assertContains(self.client.get(url), 'подписок: 0')
+        self.first_user_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'TestAuthor'}))
+        self.assertContains(self.client.get(url), 'подписок: 1')
+        self.first_user_client.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': 'TestAuthor'}))
+        self.assertContains(self.client.get(url), 'подписок: 0')
+
     def test_follow_page_use_correct_context(self):
         """Посты автора появляются в шаблоне follow_index
             только у подписчиков автора"""
@@ -304,3 +509,86 @@ class FollowPagesTests(TestCase):
         not_follower_context_object = not_follower_response.context['page_obj']
         self.assertNotIn(context, not_follower_context_object,
                          'Пост отобразился у неподписанного пользователя')
+
+    def test_follow_page_backfills_and_trims_timeline(self):
+        """При подписке в ленту попадают прежние посты автора,
+            при отписке они из нее пропадают"""
+        post = Post.objects.create(
+            text='Пост до подписки',
+            author=self.author,
+        )
+        self.first_user_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'TestAuthor'}))
+        response = self.first_user_client.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'],
+                      'Пост автора не попал в ленту после подписки')
+        self.first_user_client.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': 'TestAuthor'}))
+        response = self.first_user_client.get(reverse('posts:follow_index'))
+        self.assertNotIn(post, response.context['page_obj'],
+                         'Пост автора остался в ленте после отписки')
+
+
+class FeedQueriesTest(TestCase):
+    """Количество запросов ленты не зависит от числа постов на странице"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='TestReader')
+        cls.author = User.objects.create_user(username='TestAuthor',
+                                              first_name='Имя',
+                                              last_name='Фамилия')
+        cls.group = Group.objects.create(title='Тестовое имя группы',
+                                         slug='test_slug',
+                                         description='Тестовая группа')
+        other_author = User.objects.create_user(username='TestOtherAuthor')
+        Post.objects.bulk_create(
+            Post(text=f'Тестовый текст поста {i}',
+                 author=(cls.author, other_author)[i % 2],
+                 group=cls.group if i % 3 else None)
+            for i in range(POSTS_NUMBER * 2)
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feeds_use_fixed_number_of_queries(self):
+        """Ленты выполняют фиксированное число запросов"""
+        feeds = (
+            (self.guest_client, reverse('posts:index'), 1),
+            (self.guest_client, reverse('posts:group_list',
+                                        kwargs={'slug': 'test_slug'}), 2),
+            (self.guest_client, reverse('posts:profile',
+                                        kwargs={'username': 'TestAuthor'}),
+             2),
+            (self.reader_client, reverse('posts:follow_index'), 3),
+        )
+        for client, url, queries in feeds:
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    response = client.get(url)
+                self.assertTrue(len(response.context['page_obj']))
+
+    def test_post_detail_uses_fixed_number_of_queries(self):
+        """Страница поста: пост с автором, группой и счетчиками одним
+            запросом и первая пачка комментариев с авторами вторым"""
+        post = Post.objects.filter(author=self.author,
+                                   group=self.group).first()
+        Comment.objects.bulk_create(
+            Comment(post=post, author=(self.reader, self.author)[i % 2],
+                    text=f'Комментарий {i}')
+            for i in range(settings.COMMENTS_NUMBER + 1)
+        )
+        url = reverse('posts:post_detail', args=[post.pk])
+        with self.assertNumQueries(2):
+            response = self.guest_client.get(url)
+        self.assertEqual(len(response.context['comments']),
+                         settings.COMMENTS_NUMBER)
+        # Плюс сессия и пользователь для авторизованного читателя
+        with self.assertNumQueries(4):
+            self.reader_client.get(url)
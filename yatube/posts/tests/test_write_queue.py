@@ -0,0 +1,144 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import feed_cache, search, write_queue
+from ..models import AuthorCounters, Comment, Follow, Post, User
+
+
+@override_settings(WRITE_BEHIND=True, WRITE_BEHIND_INTERVAL=0)
+class WriteBehindTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+        self.addCleanup(write_queue._queue.clear)
+
+    def test_comment_is_visible_before_saved(self):
+        """Автор видит свой комментарий до записи в базу"""
+        self.client.post(reverse('posts:add_comment', args=[self.post.pk]),
+                         {'text': 'Отложенный'})
+        self.assertFalse(Comment.objects.exists())
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        self.assertContains(response, 'Отложенный')
+        self.client.logout()
+        self.assertNotContains(self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])), 'Отложенный')
+
+    def test_drain_saves_batch(self):
+        """Очередь сохраняется одной пачкой со счетчиками"""
+        for i in range(3):
+            write_queue.add_comment(self.reader, self.post, f'Текст {i}')
+        self.assertEqual(write_queue.drain(), 3)
+        self.assertEqual(self.post.comments.count(), 3)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 3)
+        self.assertEqual(write_queue.pending_comments(self.reader,
+                                                      self.post.pk), [])
+
+    def drain_queries(self, existing):
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.author, text=f'Старый {i}')
+            for i in range(existing))
+        write_queue.add_comment(self.reader, post, 'Новый комментарий')
+        with CaptureQueriesContext(connection) as queries:
+            write_queue.drain()
+        return len(queries)
+
+    def test_drain_indexes_only_new_comments(self):
+        """Пачка индексирует только свои комментарии одним запросом"""
+        self.assertEqual(self.drain_queries(1), self.drain_queries(20))
+        results, _ = search.search('новый', 10)
+        self.assertEqual(len(results), 2)
+
+    def test_deleted_author_is_skipped(self):
+        """Записи удаленного пользователя не сохраняются"""
+        ghost = User.objects.create_user(username='ghost')
+        write_queue.add_comment(ghost, self.post, 'Пропавший')
+        write_queue.set_follow(ghost, self.author, True)
+        write_queue.add_comment(self.reader, self.post, 'Сохраненный')
+        ghost.delete()
+        self.assertEqual(write_queue.drain(), 3)
+        self.assertEqual(
+            list(self.post.comments.values_list('text', flat=True)),
+            ['Сохраненный'])
+        self.assertFalse(Follow.objects.exists())
+
+    def test_failed_item_is_dropped(self):
+        """Запись, которую нельзя сохранить, не задерживает очередь"""
+        save_comments = write_queue._save_comments
+
+        def broken(items):
+            if any(item[3] == 'Сломанный' for item in items):
+                raise ValueError
+            return save_comments(items)
+
+        write_queue.add_comment(self.reader, self.post, 'Сломанный')
+        write_queue.add_comment(self.reader, self.post, 'Сохраненный')
+        with self.assertLogs('posts.write_queue', 'ERROR') as logs:
+            with mock.patch.object(write_queue, '_save_comments', broken):
+                self.assertEqual(write_queue.drain(), 2)
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(
+            list(self.post.comments.values_list('text', flat=True)),
+            ['Сохраненный'])
+        self.assertEqual(write_queue.drain(), 0)
+
+    def test_follow_is_visible_before_saved(self):
+        """Подписка видна в профиле и ленте сразу"""
+        self.client.get(reverse('posts:profile_follow',
+                                args=[self.author.username]))
+        self.assertFalse(Follow.objects.exists())
+        response = self.client.get(reverse('posts:profile',
+                                           args=[self.author.username]))
+        self.assertTrue(response.context['following'])
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+        self.assertTrue(Follow.objects.filter(user=self.reader,
+                                              author=self.author).exists())
+        self.assertEqual(
+            AuthorCounters.objects.get(user=self.author).followers_count, 1)
+
+    def test_last_follow_action_wins(self):
+        """Из подписки и отписки в одной пачке остается последняя"""
+        write_queue.set_follow(self.reader, self.author, True)
+        write_queue.set_follow(self.reader, self.author, False)
+        self.assertFalse(write_queue.pending_follow(self.reader,
+                                                    self.author.pk))
+        write_queue.drain()
+        self.assertFalse(Follow.objects.exists())
+
+    def test_follow_bumps_both_profiles(self):
+        """Сохраненная подписка сбрасывает кэш профилей автора и
+        подписчика"""
+        scopes = (feed_cache.author_scope(self.author.pk),
+                  feed_cache.author_scope(self.reader.pk))
+        before = feed_cache.generations(*scopes)
+        write_queue.set_follow(self.reader, self.author, True)
+        middle = feed_cache.generations(*scopes)
+        write_queue.drain()
+        after = feed_cache.generations(*scopes)
+        self.assertNotEqual(before[1], after[1])
+        self.assertNotEqual(middle, after)
+
+    def test_unfollow(self):
+        """Отложенная отписка удаляет подписку и ленту"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.get(reverse('posts:profile_unfollow',
+                                args=[self.author.username]))
+        write_queue.drain()
+        self.assertFalse(Follow.objects.exists())
+        self.assertFalse(self.reader.timeline.exists())
+        self.assertEqual(
+            AuthorCounters.objects.get(user=self.author).followers_count, 0)
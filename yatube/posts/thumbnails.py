@@ -0,0 +1,176 @@
+"""Готовые уменьшенные копии картинок постов.
+
+Варианты из settings.POST_IMAGE_RENDITIONS строятся после сохранения
+поста, когда транзакция уже закоммичена, и не задерживают ответ автору:
+по умолчанию — тем же воркером после отправки ответа (request_finished),
+а если POST_IMAGE_RENDITION_WORKERS больше нуля — в пуле потоков. Вне
+запросов (команды, shell) варианты строятся сразу. Пока варианты не
+готовы, шаблоны выводят миниатюру sorl. Имена и размеры файлов
+записываются в Post.image_renditions, и шаблоны выводят их, не открывая
+исходную картинку. Посты без готовых вариантов
+достраивает команда build_renditions, а их миниатюры sorl для целой
+страницы находит prefetch.
+"""
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import connections, transaction
+from django.dispatch import receiver
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import feed_cache
+from .images import MIME_TYPES, extra_formats
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+# Посты, варианты которых строятся после ответа на текущий запрос
+_local = threading.local()
+
+
+def render(image):
+    """Строит все варианты картинки и возвращает их описание"""
+    if not image.storage.exists(image.name):
+        raise FileNotFoundError(image.name)
+    renditions = {'source': image.name}
+    formats = extra_formats()
+    for name, (geometry, options) in settings.POST_IMAGE_RENDITIONS.items():
+        thumbnail = get_thumbnail(image, geometry, **options)
+        renditions[name] = {
+            'name': thumbnail.name,
+            'width': thumbnail.width,
+            'height': thumbnail.height,
+            'sources': [
+                {'type': MIME_TYPES[fmt],
+                 'name': get_thumbnail(image, geometry, format=fmt,
+                                       **options).name}
+                for fmt in formats
+            ],
+        }
+    return renditions
+
+
+def build(post_id):
+    """Строит варианты картинки поста и сохраняет их в базе.
+
+    Возвращает True, если варианты записаны.
+    """
+    post = (Post.objects.filter(pk=post_id)
+            .only('image', 'author_id', 'group_id').first())
+    if post is None or not post.image:
+        return False
+    try:
+        renditions = render(post.image)
+    except Exception:
+        logger.exception('Не удалось построить варианты картинки поста %s',
+                         post_id)
+        return False
+    # Если картинку успели заменить, описание старой не записывается
+    stored = bool(
+        Post.objects.filter(pk=post_id, image=post.image.name)
+        .update(image_renditions=json.dumps(renditions))
+    )
+    if stored:
+        # Страницы, закэшированные с миниатюрой sorl, строятся заново
+        feed_cache.bump_post(post)
+    return stored
+
+
+def _build_in_worker(post_id):
+    try:
+        build(post_id)
+    finally:
+        connections.close_all()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.POST_IMAGE_RENDITION_WORKERS,
+                thread_name_prefix='renditions',
+            )
+        return _executor
+
+
+def _submit(post_id):
+    if settings.POST_IMAGE_RENDITION_WORKERS:
+        _get_executor().submit(_build_in_worker, post_id)
+    elif getattr(_local, 'pending', None) is not None:
+        _local.pending.append(post_id)
+    else:
+        build(post_id)
+
+
+@receiver(request_started)
+def _start_request(sender, **kwargs):
+    _local.pending = []
+
+
+@receiver(request_finished)
+def _build_after_response(sender, **kwargs):
+    """Строит варианты, отложенные запросом: ответ уже отправлен"""
+    pending, _local.pending = getattr(_local, 'pending', None), None
+    for post_id in pending or ():
+        try:
+            build(post_id)
+        except Exception:
+            logger.exception('Не удалось построить варианты картинки '
+                             'поста %s', post_id)
+
+
+def schedule(post):
+    """Ставит построение вариантов на момент после коммита транзакции"""
+    if not post.image:
+        return
+    post_id = post.pk
+    transaction.on_commit(lambda: _submit(post_id))
+
+
+def thumbnail_file(image, geometry, **options):
+    """Файл миниатюры, который вернул бы get_thumbnail, без чтения
+    картинки и хранилища ключей"""
+    backend = default.backend
+    source = ImageFile(image)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def prefetch(posts, rendition='list'):
+    """Находит миниатюры постов без готовых вариантов одним обращением
+    к хранилищу ключей sorl и кладет их в post.thumbnail.
+
+    Если миниатюры еще нет, post.thumbnail равен None и шаблон строит
+    ее тегом thumbnail.
+    """
+    geometry, options = settings.POST_IMAGE_RENDITIONS[rendition]
+    pending = []
+    for post in posts:
+        post.thumbnail = None
+        if post.image and not post.renditions:
+            pending.append(
+                (post, thumbnail_file(post.image, geometry, **options)))
+    if not pending:
+        return
+    found = default.kvstore.get_many(
+        [thumbnail for _, thumbnail in pending])
+    for post, thumbnail in pending:
+        post.thumbnail = found.get(thumbnail.key)
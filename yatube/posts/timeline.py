@@ -0,0 +1,78 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост сразу раскладывается по лентам подписчиков автора, при
+подписке в ленту добавляются последние посты автора, а при отписке
+они из нее убираются. Чтение /follow/ тогда — один проход по индексу
+(user, pub_date) таблицы TimelineEntry.
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Follow, Post, TimelineEntry
+
+
+def _bulk_insert(entries):
+    """Сохраняет записи пачками, не держа их все в памяти"""
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, settings.TIMELINE_BATCH_SIZE))
+        if not batch:
+            break
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора"""
+    followers = (Follow.objects.filter(author_id=post.author_id)
+                 .values_list('user_id', flat=True).iterator())
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post.pk,
+                      author_id=post.author_id, pub_date=post.pub_date)
+        for user_id in followers
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика последние посты автора"""
+    posts = (Post.objects.filter(author_id=author_id)
+             .order_by('-pub_date', '-pk')
+             .values_list('pk', 'pub_date')[:settings.TIMELINE_BACKFILL])
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post_id,
+                      author_id=author_id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def backfill_follows(follows):
+    """Заполняет ленты для подписок из queryset follows одним
+    INSERT ... SELECT: каждому подписчику — последние TIMELINE_BACKFILL
+    постов автора. Нужна для массовой загрузки, где backfill на каждую
+    подписку слишком медленный.
+    """
+    follow_ids, params = follows.values('pk').query.sql_with_params()
+    ops = connection.ops
+    sql = f'''
+        {ops.insert_statement(ignore_conflicts=True)}
+        {TimelineEntry._meta.db_table} (user_id, post_id, author_id, pub_date)
+        SELECT f.user_id, p.id, p.author_id, p.pub_date
+        FROM {Follow._meta.db_table} f
+        JOIN (
+            SELECT id, author_id, pub_date, ROW_NUMBER() OVER (
+                PARTITION BY author_id ORDER BY pub_date DESC, id DESC
+            ) AS position
+            FROM {Post._meta.db_table}
+        ) p ON p.author_id = f.author_id AND p.position <= %s
+        WHERE f.id IN ({follow_ids})
+        {ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}
+    '''
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [settings.TIMELINE_BACKFILL, *params])
+
+
+def trim(user_id, author_id):
+    """Убирает из ленты подписчика посты автора"""
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 author_id=author_id).delete()
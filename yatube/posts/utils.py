@@ -1,9 +1,199 @@
-from django.core.paginator import Paginator
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 from yatube.settings import POSTS_NUMBER
 
+from .models import Comment
 
-def context_list(queryset, request):
-    paginator = Paginator(queryset, POSTS_NUMBER)
+
+class WindowPaginator(Paginator):
+    """Paginator, который выводит окно номеров вокруг текущей страницы.
+
+    Вместо всех page_range шаблону отдается get_elided_page_range, как
+    в Django 3.2: первые и последние страницы, соседи текущей и
+    многоточия между ними. Число записей берется у counter
+    (posts.page_counts); если оно неточное, последние страницы не
+    выводятся, а у конца известных страниц записи пересчитываются.
+    """
+    ELLIPSIS = '…'
+    ON_EACH_SIDE = 3
+    ON_ENDS = 2
+
+    def __init__(self, object_list, per_page, counter=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.counter = counter
+        self.count_is_exact = True
+
+    @cached_property
+    def count(self):
+        if self.counter is None:
+            return super().count
+        value, self.count_is_exact = self.counter.count(self.object_list)
+        return value
+
+    def count_exactly(self):
+        """Отбрасывает неточное число записей и считает их заново"""
+        self.__dict__.pop('count', None)
+        self.__dict__.pop('num_pages', None)
+        self.counter = None
+        self.count_is_exact = True
+
+    def get_page(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            number = 1
+        # num_pages заодно узнает у counter, точное ли число записей.
+        # Страница за пределами известных тоже пересчитывается: счетчики
+        # могли отстать после массовых операций в обход сигналов
+        if self.counter is not None and (
+                number > self.num_pages
+                or number >= self.num_pages - self.ON_EACH_SIDE
+                and not self.count_is_exact):
+            self.count_exactly()
+        return super().get_page(number)
+
+    def get_elided_page_range(self, number=1, *, on_each_side=ON_EACH_SIDE,
+                              on_ends=ON_ENDS):
+        number = self.validate_number(number)
+        if (self.count_is_exact
+                and self.num_pages <= (on_each_side + on_ends) * 2):
+            yield from self.page_range
+            return
+        if number > 1 + on_each_side + on_ends + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if not self.count_is_exact:
+            # Сколько всего страниц, неизвестно: окно обрывается многоточием
+            yield from range(number + 1,
+                             min(number + on_each_side, self.num_pages) + 1)
+            yield self.ELLIPSIS
+        elif number < self.num_pages - on_each_side - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(self.num_pages - on_ends + 1,
+                             self.num_pages + 1)
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (дата, id).
+
+    Вместо COUNT(*) и OFFSET выбирает не больше per_page + 1 записей
+    после (?after=) или до (?before=) курсора, поэтому любая страница
+    стоит столько же, сколько первая.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, date_field='pub_date',
+                 descending=True):
+        super().__init__(object_list, per_page)
+        self.date_field = date_field
+        self.descending = descending
+
+    def encode_cursor(self, obj):
+        value = f'{getattr(obj, self.date_field).isoformat()}|{obj.pk}'
+        return urlsafe_base64_encode(value.encode())
+
+    def decode_cursor(self, cursor):
+        """Возвращает ключ (дата, id) или None, если курсор испорчен"""
+        try:
+            date, pk = urlsafe_base64_decode(cursor).decode().split('|')
+            date = parse_datetime(date)
+            pk = int(pk)
+        except (ValueError, UnicodeDecodeError):
+            return None
+        if date is None:
+            return None
+        return date, pk
+
+    def _ordering(self, reverse=False):
+        fields = (self.date_field, 'pk')
+        if self.descending != reverse:
+            return [f'-{field}' for field in fields]
+        return list(fields)
+
+    def _seek(self, key, reverse=False):
+        """Условие на записи, идущие за ключом в порядке вывода"""
+        date, pk = key
+        lookup = 'lt' if self.descending != reverse else 'gt'
+        return (Q(**{f'{self.date_field}__{lookup}': date})
+                | Q(**{self.date_field: date, f'pk__{lookup}': pk}))
+
+    def page_queryset(self, key=None, reverse=False):
+        """Запрос одной страницы за ключом: per_page + 1 записей"""
+        queryset = self.object_list.order_by(*self._ordering(reverse))
+        if key is not None:
+            queryset = queryset.filter(self._seek(key, reverse))
+        return queryset[:self.per_page + 1]
+
+    def _fetch(self, key=None, reverse=False):
+        rows = list(self.page_queryset(key, reverse))
+        return rows[:self.per_page], len(rows) > self.per_page
+
+    def get_cursor_page(self, after=None, before=None):
+        """Возвращает страницу после или до курсора.
+
+        Без курсора или с испорченным курсором отдает первую страницу.
+        Номер страницы при переходе по курсору неизвестен, поэтому у
+        таких страниц number равен None.
+        """
+        after_key = self.decode_cursor(after) if after else None
+        before_key = self.decode_cursor(before) if before else None
+        number = None
+        if after_key is not None:
+            rows, has_next = self._fetch(after_key)
+            has_previous = True
+        elif before_key is not None:
+            rows, has_previous = self._fetch(before_key, reverse=True)
+            rows.reverse()
+            has_next = True
+            if not has_previous:
+                number = 1
+        else:
+            rows, has_next = self._fetch()
+            has_previous = False
+            number = 1
+        page = Page(rows, number, self)
+        page.next_cursor = (self.encode_cursor(rows[-1])
+                            if has_next and rows else None)
+        page.previous_cursor = (self.encode_cursor(rows[0])
+                                if has_previous and rows else None)
+        return page
+
+
+def context_list(queryset, request, date_field='pub_date', counter=None):
+    """Возвращает страницу записей для шаблона.
+
+    По умолчанию страницы листаются курсором (?after=/?before=);
+    ссылки вида ?page=N обслуживает WindowPaginator, который берет
+    число записей у counter (posts.page_counts).
+    """
     page_number = request.GET.get('page')
-    page_context = paginator.get_page(page_number)
-    return page_context
+    if page_number is not None:
+        paginator = WindowPaginator(queryset, POSTS_NUMBER, counter)
+        page = paginator.get_page(page_number)
+        page.page_window = list(
+            paginator.get_elided_page_range(page.number))
+        return page
+    paginator = CursorPaginator(queryset, POSTS_NUMBER, date_field)
+    return paginator.get_cursor_page(request.GET.get('after'),
+                                     request.GET.get('before'))
+
+
+def comment_page(post_id, after=None):
+    """Комментарии поста от старых к новым, по курсору (created, id).
+
+    Автор выбирается тем же запросом.
+    """
+    comments = Comment.objects.filter(post_id=post_id).select_related('author')
+    paginator = CursorPaginator(comments, settings.COMMENTS_NUMBER,
+                                'created', descending=False)
+    return paginator.get_cursor_page(after)
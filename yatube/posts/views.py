@@ -1,64 +1,135 @@
+from django.conf import settings
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from .models import Post, Group, User, Follow
+from .models import Post, Group, User, Follow, TimelineEntry
 from .forms import PostForm, CommentForm
-from .utils import context_list
+from .utils import comment_page, context_list
+from .counters import get_author_counters
+from .page_counts import CachedCount, CappedCount, CounterCount
+from . import feed_cache, search, thumbnails, write_queue
 
 
 def index(request):
     """Выводит шаблон главной страницы"""
-    posts = Post.objects.select_related('group').all()
-    page_obj = context_list(posts, request)
+    page = feed_cache.CachedPage(request, feed_cache.index_scope())
+    if page.response is not None:
+        return page.response
+    posts = Post.objects.for_feed()
+    page_obj = context_list(posts, request, counter=CachedCount('index'))
     context = {
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        **feed_cache.feed_cache_context(request, feed_cache.index_scope()),
     }
-    return render(request, 'posts/index.html', context)
+    return page.finish(render(request, 'posts/index.html', context))
 
 
 def group_posts(request, slug):
     """Выводит шаблон с постами в группе"""
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page_obj = context_list(posts, request)
+    page = feed_cache.CachedPage(request, feed_cache.group_scope(group.pk))
+    if page.response is not None:
+        return page.response
+    posts = group.posts.for_feed()
+    page_obj = context_list(posts, request,
+                            counter=CounterCount(lambda: group.posts_count))
     context = {
         'group': group,
         'page_obj': page_obj,
+        **feed_cache.feed_cache_context(
+            request, feed_cache.group_scope(group.pk)),
     }
-    return render(request, 'posts/group_list.html', context)
+    return page.finish(render(request, 'posts/group_list.html', context))
 
 
 def profile(request, username):
     """Выводит шаблон профайла автора"""
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    posts_count = posts.count()  # количество постов автора
-    page_obj = context_list(posts, request)
-    following = (request.user.is_authenticated
-                 and Follow.objects.filter(
-                     user=request.user,
-                     author=author).exists())
+    author = get_object_or_404(User.objects.select_related('counters'),
+                               username=username)
+    page = feed_cache.CachedPage(request, feed_cache.author_scope(author.pk))
+    if page.response is not None:
+        return page.response
+    counters = get_author_counters(author)
+    posts = author.posts.for_feed()
+    page_obj = context_list(
+        posts, request, counter=CounterCount(lambda: counters.posts_count))
+    following = write_queue.pending_follow(request.user, author.pk)
+    if following is None:
+        following = (request.user.is_authenticated
+                     and Follow.objects.filter(
+                         user=request.user,
+                         author=author).exists())
     context = {
         'author': author,
-        'post_count': posts_count,
+        'post_count': counters.posts_count,
+        'counters': counters,
         'page_obj': page_obj,
         'following': following,
+        **feed_cache.feed_cache_context(
+            request, feed_cache.author_scope(author.pk)),
     }
-    return render(request, 'posts/profile.html', context)
+    return page.finish(render(request, 'posts/profile.html', context))
 
 
 def post_detail(request, post_id):
     """Выводит шаблон конкретного поста"""
-    post = get_object_or_404(Post, pk=post_id)
-    post_count = post.author.posts.count()
+    post = get_object_or_404(Post.objects.for_detail(), pk=post_id)
+    page = feed_cache.CachedPage(request, feed_cache.post_scope(post.pk),
+                                 feed_cache.author_scope(post.author_id))
+    if page.response is not None:
+        return page.response
+    post_count = get_author_counters(post.author).posts_count
     form = CommentForm()
-    comments = post.comments.all()
+    comments = comment_page(post.pk, request.GET.get('after'))
     context = {
         'post': post,
         'post_count': post_count,
         'form': form,
         'comments': comments,
+        'pending_comments': write_queue.pending_comments(request.user,
+                                                         post.pk),
     }
-    return render(request, 'posts/post_detail.html', context)
+    return page.finish(render(request, 'posts/post_detail.html', context))
+
+
+def post_comments(request, post_id):
+    """Отдает следующую пачку комментариев HTML-фрагментом
+        или JSON (?format=json)"""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments = comment_page(post.pk, request.GET.get('after'))
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                }
+                for comment in comments
+            ],
+            'next_cursor': comments.next_cursor,
+        })
+    context = {
+        'post': post,
+        'comments': comments,
+        'pending_comments': write_queue.pending_comments(request.user,
+                                                         post.pk),
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
+def post_search(request):
+    """Ищет посты по тексту, комментариям, группе и автору"""
+    query = request.GET.get('q', '').strip()
+    posts, next_cursor = search.search(
+        query, settings.POSTS_NUMBER, request.GET.get('after'))
+    context = {
+        'query': query,
+        'posts': posts,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'posts/search.html', context)
 
 
 @login_required
@@ -67,7 +138,8 @@ def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         form.instance.author = request.user
-        form.save()
+        post = form.save()
+        thumbnails.schedule(post)
         return redirect('posts:profile', request.user)
     context = {
         'form': form,
@@ -88,6 +160,8 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('posts:post_detail', post_id)
     context = {
         'form': form,
@@ -112,6 +186,10 @@ def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
+        if write_queue.enabled():
+            write_queue.add_comment(request.user, post,
+                                    form.cleaned_data['text'])
+            return redirect('posts:post_detail', post_id=post_id)
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
@@ -123,8 +201,11 @@ def add_comment(request, post_id):
 def follow_index(request):
     """Выводит шаблон страницы с постами авторов
         на которых подписан пользователь"""
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = context_list(posts, request)
+    if write_queue.enabled():
+        write_queue.drain(request.user)
+    entries = TimelineEntry.objects.for_feed().filter(user=request.user)
+    page_obj = context_list(entries, request, counter=CappedCount())
+    page_obj.object_list = [entry.post for entry in page_obj]
     context = {
         'page_obj': page_obj
     }
@@ -136,7 +217,10 @@ def profile_follow(request, username):
     """Подписывает пользователя на другого автора"""
     author = get_object_or_404(User, username=username)
     if request.user != author:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        if write_queue.enabled():
+            write_queue.set_follow(request.user, author, True)
+        else:
+            Follow.objects.get_or_create(user=request.user, author=author)
     return redirect('posts:profile', username=username)
 
 
@@ -144,5 +228,8 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     """Отписывает ползователя от другого автора"""
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user, author=author).delete()
+    if write_queue.enabled():
+        write_queue.set_follow(request.user, author, False)
+    else:
+        Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username=username)
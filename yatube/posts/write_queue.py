@@ -0,0 +1,248 @@
+"""Отложенная запись комментариев и подписок (write-behind).
+
+Если WRITE_BEHIND включен, add_comment и profile_follow/unfollow не
+пишут в базу, а кладут запись в очередь процесса. Фоновый поток раз в
+WRITE_BEHIND_INTERVAL секунд (или как только набралась пачка) сохраняет
+очередь пачками: комментарии одним bulk_create, подписки — bulk_create
+и одним DELETE, а счетчики, ленты, поисковый индекс и поколения кэша
+обновляет один раз на пачку вместо сигналов на каждую строку.
+
+Пока запись не сохранена, автор все равно видит ее на следующей
+странице: views добавляют к выдаче pending_comments и pending_follow,
+а лента подписок перед чтением сохраняет отложенные подписки читателя.
+
+С WRITE_BEHIND_INTERVAL = 0 потока нет и очередь сохраняет только
+drain().
+
+Очередь живет в памяти процесса: при аварийном завершении несохраненные
+записи теряются, при обычном — сохраняются (atexit). Свои несохраненные
+записи пользователь видит, только пока его запросы попадают в тот же
+процесс: при нескольких воркерах за балансировщиком следующий запрос
+может их не показать до сохранения пачки, то есть до
+WRITE_BEHIND_INTERVAL секунд.
+
+Если пачка не сохранилась, ее записи сохраняются по одной, а те, что
+не сохраняются и так (например, автор успел удалиться), пишутся в лог
+и отбрасываются, чтобы не задерживать очередь.
+"""
+import atexit
+import logging
+import threading
+from collections import deque
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from . import counters, feed_cache, search, signals, timeline
+from .models import Comment, Follow, Post, User
+
+logger = logging.getLogger(__name__)
+
+COMMENT = 'comment'
+FOLLOW = 'follow'
+
+_queue = deque()
+# Пачка, которая сейчас сохраняется: ее тоже видно автору
+_in_flight = []
+_lock = threading.Lock()
+# Один поток сохраняет пачку за раз
+_drain_lock = threading.Lock()
+_wakeup = threading.Event()
+_worker = None
+
+
+def enabled():
+    return settings.WRITE_BEHIND
+
+
+def _ensure_worker():
+    global _worker
+    if not settings.WRITE_BEHIND_INTERVAL:
+        return
+    with _lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_work, name='write-behind',
+                                       daemon=True)
+            _worker.start()
+            atexit.register(drain)
+
+
+def _work():
+    while True:
+        _wakeup.wait(settings.WRITE_BEHIND_INTERVAL)
+        _wakeup.clear()
+        try:
+            while drain():
+                pass
+        except Exception:
+            logger.exception('Не удалось сохранить отложенные записи')
+        finally:
+            connections.close_all()
+
+
+def _put(item):
+    with _lock:
+        _queue.append(item)
+        full = len(_queue) >= settings.WRITE_BEHIND_BATCH_SIZE
+    _ensure_worker()
+    if full:
+        _wakeup.set()
+
+
+def add_comment(user, post, text):
+    """Ставит комментарий в очередь"""
+    _put((COMMENT, user.pk, post.pk, text, timezone.now()))
+    feed_cache.bump(feed_cache.post_scope(post.pk))
+
+
+def set_follow(user, author, following):
+    """Ставит в очередь подписку (following=True) или отписку"""
+    _put((FOLLOW, user.pk, author.pk, following))
+    feed_cache.bump(feed_cache.author_scope(author.pk))
+
+
+def _pending():
+    with _lock:
+        return [*_in_flight, *_queue]
+
+
+def pending_comments(user, post_id):
+    """Несохраненные комментарии пользователя к посту"""
+    if not user.is_authenticated:
+        return []
+    return [
+        Comment(author=user, post_id=item_post, text=text, created=created)
+        for kind, user_id, item_post, text, created in (
+            item for item in _pending() if item[0] == COMMENT)
+        if user_id == user.pk and item_post == post_id
+    ]
+
+
+def pending_follow(user, author_id):
+    """Состояние несохраненной подписки: True, False или None, если
+    в очереди ее нет"""
+    state = None
+    if user.is_authenticated:
+        for item in _pending():
+            if item[0] == FOLLOW and item[1:3] == (user.pk, author_id):
+                state = item[3]
+    return state
+
+
+def drain(user=None):
+    """Сохраняет одну пачку очереди; возвращает ее размер.
+
+    С user сохраняются только записи этого пользователя — так лента
+    подписок читает уже сохраненные подписки.
+    """
+    with _drain_lock:
+        with _lock:
+            if user is None:
+                batch = [_queue.popleft() for _ in range(
+                    min(len(_queue), settings.WRITE_BEHIND_BATCH_SIZE))]
+            else:
+                batch = [item for item in _queue if item[1] == user.pk]
+                for item in batch:
+                    _queue.remove(item)
+            _in_flight[:] = batch
+        try:
+            if batch:
+                _save_or_split(batch)
+        finally:
+            with _lock:
+                _in_flight.clear()
+    return len(batch)
+
+
+def _save_or_split(batch):
+    """Сохраняет пачку, а при ошибке — каждую запись отдельно"""
+    try:
+        _save(batch)
+        return
+    except Exception:
+        if len(batch) == 1:
+            logger.exception('Отложенная запись отброшена: %r', batch[0])
+            return
+        logger.exception('Пачка из %d записей не сохранилась, записи '
+                         'сохраняются по одной', len(batch))
+    for item in batch:
+        _save_or_split([item])
+
+
+def _save(batch):
+    comments = [item for item in batch if item[0] == COMMENT]
+    # Из нескольких действий с одной подпиской важно последнее
+    follows = {(user_id, author_id): following
+               for _, user_id, author_id, following in (
+                   item for item in batch if item[0] == FOLLOW)}
+    with transaction.atomic():
+        post_ids = _save_comments(comments)
+        pairs = _save_follows(follows)
+    # Подписка меняет профили и автора, и подписчика
+    user_ids = {pk for pair in pairs for pk in pair}
+    feed_cache.bump(*(feed_cache.post_scope(pk) for pk in post_ids),
+                    *(feed_cache.author_scope(pk) for pk in user_ids))
+
+
+def _existing(model, ids):
+    return set(model.objects.filter(pk__in=ids)
+               .values_list('pk', flat=True))
+
+
+def _save_comments(items):
+    """Сохраняет комментарии существующих авторов к существующим постам"""
+    if not items:
+        return set()
+    post_ids = _existing(Post, {item[2] for item in items})
+    user_ids = _existing(User, {item[1] for item in items})
+    last_pk = Comment.objects.aggregate(last=Max('pk'))['last'] or 0
+    Comment.objects.bulk_create([
+        Comment(author_id=user_id, post_id=post_id, text=text,
+                created=created)
+        for _, user_id, post_id, text, created in items
+        if post_id in post_ids and user_id in user_ids
+    ])
+    counters.rebuild_posts(Post.objects.filter(pk__in=post_ids))
+    search.index_new_comments(last_pk)
+    return post_ids
+
+
+def _save_follows(follows):
+    """Применяет подписки и отписки; возвращает измененные пары
+    (подписчик, автор)"""
+    if not follows:
+        return []
+    user_ids = _existing(User, {pk for pair in follows for pk in pair})
+    follows = {pair: following for pair, following in follows.items()
+               if set(pair) <= user_ids}
+    if not follows:
+        return []
+    existing = set(Follow.objects.filter(
+        reduce(or_, (Q(user_id=user_id, author_id=author_id)
+                     for user_id, author_id in follows)))
+        .values_list('user_id', 'author_id'))
+    added = [pair for pair, following in follows.items()
+             if following and pair not in existing and pair[0] != pair[1]]
+    removed = [pair for pair, following in follows.items()
+               if not following and pair in existing]
+    Follow.objects.bulk_create(
+        [Follow(user_id=user_id, author_id=author_id)
+         for user_id, author_id in added],
+        ignore_conflicts=True)
+    if removed:
+        with signals.muted():
+            Follow.objects.filter(reduce(or_, (
+                Q(user_id=user_id, author_id=author_id)
+                for user_id, author_id in removed))).delete()
+    for user_id, author_id in added:
+        timeline.backfill(user_id, author_id)
+    for user_id, author_id in removed:
+        timeline.trim(user_id, author_id)
+    changed = added + removed
+    counters.rebuild_authors(User.objects.filter(
+        pk__in={pk for pair in changed for pk in pair}))
+    return changed
@@ -73,14 +73,47 @@ MIDDLEWARE = [
     'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+METRICS: bool = os.environ.get('YATUBE_METRICS', '1') == '1'  # Метрики запросов по представлениям (/health/metrics/)
+
+METRICS_LOG: bool = os.environ.get('YATUBE_METRICS_LOG') == '1'  # Писать метрики каждого запроса строкой в лог core.metrics
+
+METRICS_WINDOW: int = 300  # За сколько последних секунд копятся метрики
+
+METRICS_SLICES: int = 5  # На сколько отрезков делится окно метрик
+
+if METRICS:
+    MIDDLEWARE.insert(0, 'core.middleware.MetricsMiddleware')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.metrics': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+
+# Кэширующий загрузчик компилирует каждый шаблон один раз на процесс;
+# по умолчанию он включен, когда DEBUG выключен
+TEMPLATE_CACHE: bool = os.environ.get('YATUBE_TEMPLATE_CACHE', '0' if DEBUG else '1') == '1'
+
+TEMPLATE_PROFILING: bool = os.environ.get('YATUBE_TEMPLATE_PROFILING') == '1'  # Замер времени рендеринга шаблонов (/health/templates/)
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
+        'APP_DIRS': not TEMPLATE_CACHE,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -93,9 +126,47 @@ TEMPLATES = [
     },
 ]
 
+if TEMPLATE_CACHE:
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
+# Профиль кэша выбирается переменной окружения YATUBE_CACHE.
+# locmem — отдельный кэш в каждом процессе (разработка и тесты),
+# file, db и redis — общий кэш для всех воркеров WSGI.
+# Для db нужна таблица: python manage.py createcachetable,
+# для redis — пакет django-redis.
+CACHE_PROFILE = os.environ.get('YATUBE_CACHE', 'locmem')
+
+CACHE_PROFILES = {
+    'locmem': {
+        'BACKEND': 'core.cache.LocMemCache',
+    },
+    'file': {
+        'BACKEND': 'core.cache.FileBasedCache',
+        'LOCATION': os.environ.get('YATUBE_CACHE_LOCATION',
+                                   os.path.join(BASE_DIR, 'cache')),
+    },
+    'db': {
+        'BACKEND': 'core.cache.DatabaseCache',
+        'LOCATION': os.environ.get('YATUBE_CACHE_LOCATION', 'yatube_cache'),
+    },
+    'redis': {
+        'BACKEND': 'core.cache.RedisCache',
+        'LOCATION': os.environ.get('YATUBE_CACHE_LOCATION',
+                                   'redis://127.0.0.1:6379/1'),
+    },
+}
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        **CACHE_PROFILES[CACHE_PROFILE],
+        # Смена версии после релиза делает весь прежний кэш недоступным
+        'KEY_PREFIX': os.environ.get('YATUBE_CACHE_PREFIX', 'yatube'),
+        'VERSION': int(os.environ.get('YATUBE_CACHE_VERSION', 1)),
     }
 }
 
@@ -105,13 +176,51 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Профиль базы выбирается переменной окружения YATUBE_DB.
+# sqlite — файл рядом с проектом; настройки соединения (WAL и др.)
+# задает core.db через SQLITE_PRAGMAS. postgresql — сервер базы с
+# постоянными соединениями, нужен пакет psycopg2.
+DATABASE_PROFILE = os.environ.get('YATUBE_DB', 'sqlite')
+
+DATABASE_PROFILES = {
+    'sqlite': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('YATUBE_DB_NAME',
+                               os.path.join(BASE_DIR, 'db.sqlite3')),
+        # Сколько секунд ждать снятия блокировки записи
+        'OPTIONS': {'timeout': 20},
+        # Файл тестовой базы; по умолчанию она в памяти и без WAL
+        'TEST': {'NAME': os.environ.get('YATUBE_DB_TEST_NAME')},
+    },
+    'postgresql': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('YATUBE_DB_NAME', 'yatube'),
+        'USER': os.environ.get('YATUBE_DB_USER', 'yatube'),
+        'PASSWORD': os.environ.get('YATUBE_DB_PASSWORD', ''),
+        'HOST': os.environ.get('YATUBE_DB_HOST', '127.0.0.1'),
+        'PORT': os.environ.get('YATUBE_DB_PORT', '5432'),
+    },
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        **DATABASE_PROFILES[DATABASE_PROFILE],
+        # Соединение живет между запросами, а не открывается на каждый:
+        # для сервера базы это экономит подключение и аутентификацию,
+        # для SQLite — прагмы core.db, которые выполняются при каждом
+        # новом соединении
+        'CONN_MAX_AGE': int(os.environ.get('YATUBE_DB_CONN_MAX_AGE', 60)),
     }
 }
 
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # Читатели не ждут писателя
+    'synchronous': 'NORMAL',  # В режиме WAL fsync только при checkpoint
+    'busy_timeout': 20_000,  # Мс ожидания блокировки
+    'mmap_size': 256 * 1024 * 1024,  # Чтение файла базы через mmap
+    'temp_store': 'MEMORY',
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -151,6 +260,50 @@ LOGIN_REDIRECT_URL = 'posts:index'
 
 POSTS_NUMBER: int = 10  # Количество постов, отображаемых на странице
 
+FEED_COUNT_TIMEOUT: int = 60  # Сколько секунд хранится число постов ленты для нумерованных страниц
+
+FEED_COUNT_CAP: int = 10_000  # Больше скольки постов ленту подписок не пересчитывать
+
+COMMENTS_NUMBER: int = 20  # Сколько комментариев выводится за раз
+
+FEED_CACHE_TIMEOUT: int = 60 * 60 * 24  # Сколько хранится фрагмент ленты, если его не вытеснило новое поколение
+
+TIMELINE_BACKFILL: int = 1000  # Сколько постов автора попадет в ленту при подписке
+
+TIMELINE_BATCH_SIZE: int = 500  # Размер пачки при раскладке постов по лентам
+
+MODERATION_BATCH_SIZE: int = 1000  # Сколько записей меняет один запрос массовой модерации
+
+WRITE_BEHIND: bool = os.environ.get('YATUBE_WRITE_BEHIND') == '1'  # Комментарии и подписки пишутся в базу фоновым потоком (posts.write_queue)
+
+WRITE_BEHIND_INTERVAL: float = 0.5  # Сколько секунд копятся отложенные записи до очередной пачки; 0 - без фонового потока
+
+WRITE_BEHIND_BATCH_SIZE: int = 500  # Сколько отложенных записей сохраняется одной пачкой
+
+POST_IMAGE_MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # Предельный размер загружаемой картинки, байт
+
+POST_IMAGE_MAX_PIXELS: int = 40_000_000  # Предельное число пикселей загружаемой картинки
+
+POST_IMAGE_MAX_SIDE: int = 2048  # Оригиналы больше уменьшаются при загрузке до этой стороны
+
+FILE_UPLOAD_MAX_MEMORY_SIZE: int = 256 * 1024  # Файлы крупнее пишутся во временный файл по частям
+
+# Варианты картинки поста, которые строятся при загрузке (posts.thumbnails):
+# имя -> (геометрия sorl-thumbnail, параметры)
+POST_IMAGE_RENDITIONS = {
+    'list': ('960x339', {'crop': 'center', 'upscale': True}),
+    'retina': ('1920x678', {'crop': 'center', 'upscale': True}),
+    'detail': ('960', {'upscale': False}),
+}
+
+POST_IMAGE_EXTRA_FORMATS = ('AVIF', 'WEBP')  # Варианты еще и в этих форматах, если их умеют Pillow и sorl
+
+POST_IMAGE_RENDITION_WORKERS: int = int(os.environ.get('YATUBE_RENDITION_WORKERS', 0))  # Потоки для построения вариантов; 0 - строить тем же воркером после отправки ответа
+
+# Хранилище ключей sorl-thumbnail: таблица в базе плюс общий кэш, умеет
+# читать записи для целой страницы постов (posts.thumbnails.prefetch)
+THUMBNAIL_KVSTORE = 'core.thumbnail_kvstore.KVStore'
+
 # LOGOUT_REDIRECT_URL = 'posts:index'
 
 
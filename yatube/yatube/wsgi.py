@@ -9,8 +9,16 @@ https://docs.djangoproject.com/en/2.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
+from core import template_preload
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+# Шаблоны компилируются заранее только в процессах, которые обслуживают
+# запросы: миграциям, тестам и командам это лишь замедляет старт
+if settings.TEMPLATE_CACHE:
+    template_preload.preload()